@@ -0,0 +1,13 @@
+import hashlib
+
+
+HASH_CHUNK_SIZE = 1 << 22
+
+
+def get_file_checksum(path, chunk_size=HASH_CHUNK_SIZE):
+    # The SHA-256 of the file contents as a hex string, read in chunks.
+    checksum = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            checksum.update(chunk)
+    return checksum.hexdigest()
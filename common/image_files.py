@@ -0,0 +1,35 @@
+SNIFF_SIZE = 16
+MAGIC_NUMBERS = (
+    (b'\xff\xd8\xff', 'jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+    (b'II*\x00', 'tiff'),
+    (b'MM\x00*', 'tiff'),
+    (b'BM', 'bmp'),
+    (b'\x00\x00\x01\x00', 'ico'),
+    (b'8BPS', 'psd'),
+)
+
+
+def sniff_format(header):
+    # The format of a file from its first SNIFF_SIZE bytes, or None when it
+    # doesn't look like an image. Formats without a signature (TGA) are not
+    # recognized.
+    for magic, format in MAGIC_NUMBERS:
+        if header.startswith(magic):
+            return format
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'webp'
+    if len(header) >= 3 and header[0] == 0x0A and header[1] in (0, 2, 3, 4, 5) \
+            and header[2] in (0, 1):
+        return 'pcx'
+    if len(header) >= 3 and header[:1] == b'P' and header[1:2] in b'123456' \
+            and header[2:3].isspace():
+        return 'ppm'
+    return None
+
+
+def sniff_file(path):
+    with open(path, 'rb') as file:
+        return sniff_format(file.read(SNIFF_SIZE))
@@ -0,0 +1,42 @@
+import numpy
+
+
+# The raw modes that can be mapped for each image mode; BGR is flipped
+# into RGB after mapping.
+RAWMODES = {
+    'L': ('L',),
+    'P': ('P',),
+    'RGB': ('RGB', 'BGR'),
+    'RGBA': ('RGBA',),
+}
+
+
+def map_raw_image(image, modes=tuple(RAWMODES)):
+    # Single-tile uncompressed images (BMP, PPM, TGA, plain TIFF) in one of
+    # the given modes are memory-mapped straight from the file instead of
+    # being decoded. Anything else gives None, including images made in
+    # memory (by convert, for example), which have no tile at all.
+    tile = getattr(image, 'tile', ())
+    if len(tile) != 1 or image.mode not in modes:
+        return None
+
+    decoder, extents, offset, args = tile[0]
+    if decoder != 'raw' or tuple(extents) != (0, 0) + image.size:
+        return None
+    if isinstance(args, str):
+        args = (args, 0, 1)
+    rawmode, stride, orientation = (tuple(args) + (0, 1))[:3]
+    if rawmode not in RAWMODES[image.mode]:
+        return None
+
+    width, height = image.size
+    band_count = len(image.getbands())
+    stride = stride or width * band_count
+    rows = numpy.memmap(image.filename, dtype=numpy.uint8, mode='r',
+                        offset=offset, shape=(height, stride))
+    pixels = rows[:, :width * band_count].reshape(height, width, band_count)
+    if orientation < 0:
+        pixels = pixels[::-1]
+    if rawmode == 'BGR':
+        pixels = pixels[..., ::-1]
+    return pixels
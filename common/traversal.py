@@ -0,0 +1,160 @@
+import concurrent.futures
+import fnmatch
+import os
+
+
+def matches(name, relative_path, patterns):
+    # Patterns are matched case-insensitively against the file name and
+    # against the path relative to the root, so both '*.jpg' and
+    # 'raw/*.tif' work.
+    name, relative_path = name.lower(), relative_path.lower()
+    return any(
+        fnmatch.fnmatchcase(name, pattern) or
+        fnmatch.fnmatchcase(relative_path, pattern)
+        for pattern in patterns
+    )
+
+
+class Walker:
+    # An os.scandir walk yielding the same files as a sorted os.walk, in
+    # the same order: the files of a directory, then each subdirectory in
+    # turn. Like os.walk, everything that isn't a directory counts as a
+    # file, symlinks included; symlinked directories are only walked when
+    # follow_symlinks is set. File types come from the DirEntry objects,
+    # so plain files cost no extra stat call. Directories are only stat'ed
+    # when symlinks are followed, to skip any directory already visited.
+
+    def __init__(self, include=None, exclude=None, max_depth=None,
+                 skip_hidden=False, follow_symlinks=False):
+        self.include = [pattern.lower() for pattern in include or ()]
+        self.exclude = [pattern.lower() for pattern in exclude or ()]
+        self.max_depth = max_depth
+        self.skip_hidden = skip_hidden
+        self.follow_symlinks = follow_symlinks
+
+    def is_file_wanted(self, name, relative_path):
+        if self.exclude and matches(name, relative_path, self.exclude):
+            return False
+        return not self.include or matches(name, relative_path, self.include)
+
+    def is_directory_wanted(self, name, relative_path, depth):
+        if self.skip_hidden and name.startswith('.'):
+            return False
+        if self.max_depth is not None and depth > self.max_depth:
+            return False
+        return not (self.exclude and
+                    matches(name, relative_path, self.exclude))
+
+    def scan(self, path, relative_path, depth, visited):
+        files, directories = [], []
+        try:
+            entries = list(os.scandir(path))
+        except OSError:
+            return files, directories
+
+        for entry in entries:
+            entry_relative_path = os.path.join(relative_path, entry.name) \
+                if relative_path else entry.name
+            try:
+                if entry.is_dir():
+                    if entry.is_symlink() and not self.follow_symlinks:
+                        continue
+                    if not self.is_directory_wanted(
+                            entry.name, entry_relative_path, depth + 1):
+                        continue
+                    if self.follow_symlinks:
+                        stat = entry.stat()
+                        key = (stat.st_dev, stat.st_ino)
+                        if key in visited:
+                            continue
+                        visited.add(key)
+                    directories.append((entry.name, entry.path,
+                                        entry_relative_path))
+                elif self.is_file_wanted(entry.name, entry_relative_path):
+                    files.append((entry.name, entry.path))
+            except OSError:
+                continue
+
+        files.sort()
+        directories.sort()
+        return files, directories
+
+    def iter_tree(self, path, relative_path='', depth=0, visited=None):
+        if visited is None:
+            stat = os.stat(path)
+            visited = {(stat.st_dev, stat.st_ino)}
+
+        stack = [(path, relative_path, depth)]
+        while stack:
+            path, relative_path, depth = stack.pop()
+            files, directories = self.scan(path, relative_path, depth,
+                                           visited)
+            for name, file_path in files:
+                yield file_path
+            for name, directory_path, directory_relative_path in \
+                    reversed(directories):
+                stack.append((directory_path, directory_relative_path,
+                              depth + 1))
+
+    def iter_files(self, path, workers=None):
+        if not os.path.isdir(path):
+            yield path
+            return
+        if not workers or workers < 2:
+            yield from self.iter_tree(path)
+            return
+
+        # Every top level subdirectory is walked on its own thread. The
+        # results are still yielded in walk order, so a slow subtree holds
+        # back the ones after it, but not their scanning.
+        stat = os.stat(path)
+        visited = {(stat.st_dev, stat.st_ino)}
+        files, directories = self.scan(path, '', 0, visited)
+        for name, file_path in files:
+            yield file_path
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(list, self.iter_tree(
+                    directory_path, directory_relative_path, 1, visited
+                ))
+                for name, directory_path, directory_relative_path in directories
+            ]
+            for future in futures:
+                yield from future.result()
+
+
+def iter_files(path, include=None, exclude=None, max_depth=None,
+               skip_hidden=False, follow_symlinks=False, workers=None):
+    walker = Walker(include, exclude, max_depth, skip_hidden, follow_symlinks)
+    return walker.iter_files(path, workers)
+
+
+def add_arguments(parser):
+    group = parser.add_argument_group('directory traversal')
+    group.add_argument('--include', type=str, nargs='+', metavar='GLOB',
+                       help='Only files matching one of these patterns')
+    group.add_argument('--exclude', type=str, nargs='+', metavar='GLOB',
+                       help='Skip files and directories matching these '
+                            'patterns')
+    group.add_argument('--max-depth', type=int, default=None,
+                       help='Do not descend more than this many directories')
+    group.add_argument('--skip-hidden', action='store_true',
+                       help='Do not walk directories starting with a dot')
+    group.add_argument('--follow-symlinks', action='store_true',
+                       help='Walk into symlinked directories (cycles are '
+                            'skipped)')
+    group.add_argument('--walk-workers', type=int, default=None,
+                       help='Walk top level subdirectories on this many '
+                            'threads')
+
+
+def get_options(args):
+    return {
+        'include': args.include,
+        'exclude': args.exclude,
+        'max_depth': args.max_depth,
+        'skip_hidden': args.skip_hidden,
+        'follow_symlinks': args.follow_symlinks,
+        'workers': args.walk_workers,
+    }
@@ -0,0 +1,245 @@
+import concurrent.futures
+import hashlib
+import json
+import os
+import sys
+import time
+
+import PIL.Image
+
+import color_lut
+import engine
+import tiled
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'common'))
+import image_files
+import traversal
+
+
+RUN_LOG_FILENAME = '.recolor_run.jsonl'
+
+_converter = None
+
+
+def get_output_path(image_path, input_path, output_dir):
+    if os.path.isdir(input_path):
+        relative_path = os.path.relpath(image_path, input_path)
+    else:
+        relative_path = os.path.basename(image_path)
+    return os.path.join(output_dir, relative_path)
+
+
+def is_input_file(path, tiled_mode):
+    # Files that don't look like images are skipped instead of failing;
+    # arrays are only read by the tiled recolor. Unreadable files are kept,
+    # so their error is reported.
+    if tiled_mode and path.lower().endswith('.npy'):
+        return True
+    try:
+        return image_files.sniff_file(path) is not None
+    except OSError:
+        return True
+
+
+def get_peak_memory():
+    # The resource module only exists on Unix; elsewhere the peak is not
+    # known. ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+    try:
+        import resource
+    except ImportError:
+        return None
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    ) * scale
+
+
+def verify_luts(lut_dir):
+    # Checked once here instead of in every worker, which would each read
+    # all the tables again. Missing tables are fine, colors are converted
+    # on the fly then; a corrupted one means the cache needs a rebuild.
+    for space in engine.COLOR_SPACES:
+        if color_lut.check_lut(space, lut_dir, verify=True) == 'corrupted':
+            raise ValueError(
+                'The %s lookup table in %s is corrupted, rebuild it with '
+                'color_lut.py build' % (space, lut_dir)
+            )
+
+
+def init_worker(lut_dir):
+    global _converter
+    _converter = color_lut.ColorConverter(lut_dir)
+
+
+def recolor_file(image_path, output_path, settings):
+    start = time.perf_counter()
+
+    # The result only gets its final name once it is completely written, so
+    # no half-written file is ever left under the output name.
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    root, extension = os.path.splitext(output_path)
+    temp_path = root + '.part' + extension
+
+    if settings['max_memory']:
+        pixel_count = tiled.recolor_file_tiled(
+            image_path, temp_path,
+            settings['from_color'], settings['to_color'], settings['range'],
+            mode=settings['mode'], metric=settings['metric'],
+            converter=_converter, max_memory=settings['max_memory']
+        )
+    else:
+        image = PIL.Image.open(image_path)
+        result = engine.recolor_image(
+            image, settings['from_color'], settings['to_color'],
+            settings['range'], mode=settings['mode'],
+            metric=settings['metric'], converter=_converter
+        )
+        engine.save_recolored(result, image, temp_path)
+        pixel_count = image.width * image.height
+
+    os.replace(temp_path, output_path)
+    return pixel_count, time.perf_counter() - start
+
+
+def get_settings_digest(settings):
+    return hashlib.sha256(
+        json.dumps(settings, sort_keys=True).encode()
+    ).hexdigest()
+
+
+class RunLog:
+    # One JSON line per finished output, with the digest of the settings it
+    # was recolored with. Lines are appended as files finish, so after an
+    # interruption a resumed run only trusts the outputs it finds logged
+    # with its own settings, whatever run wrote them.
+
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        self.path = os.path.join(output_dir, RUN_LOG_FILENAME)
+        self.outputs = {}
+        self.file = None
+
+        if os.path.exists(self.path):
+            with open(self.path) as file:
+                for line in file:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # The last line of an interrupted run may be cut.
+                        continue
+                    self.outputs[entry['output']] = entry['settings']
+
+    def get_key(self, output_path):
+        return os.path.relpath(output_path, self.output_dir)
+
+    def is_done(self, output_path, settings_digest):
+        return self.outputs.get(self.get_key(output_path)) == \
+            settings_digest and os.path.exists(output_path)
+
+    def open(self):
+        # Only the last entry of every output is kept when the log is
+        # rewritten, so it doesn't grow with every run.
+        os.makedirs(self.output_dir, exist_ok=True)
+        with open(self.path + '.tmp', 'w') as file:
+            for output, settings_digest in sorted(self.outputs.items()):
+                self.write_entry(file, output, settings_digest)
+        os.replace(self.path + '.tmp', self.path)
+        self.file = open(self.path, 'a')
+
+    def write_entry(self, file, output, settings_digest):
+        file.write(json.dumps({'output': output,
+                               'settings': settings_digest}) + '\n')
+
+    def add(self, output_path, settings_digest):
+        key = self.get_key(output_path)
+        self.outputs[key] = settings_digest
+        self.write_entry(self.file, key, settings_digest)
+        self.file.flush()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def run_batch(input_path, output_dir, from_color, to_color, range_,
+              mode='auto', metric='barkovsky', workers=None, resume=False,
+              lut_dir=color_lut.DEFAULT_CACHE_DIR, max_memory=None,
+              traversal_options=None, verify_lut=False):
+    settings = {
+        'from_color': list(from_color),
+        'to_color': list(to_color),
+        'range': range_,
+        'mode': mode,
+        'metric': metric,
+        'max_memory': max_memory,
+    }
+    if verify_lut:
+        verify_luts(lut_dir)
+
+    settings_digest = get_settings_digest(settings)
+    run_log = RunLog(output_dir)
+
+    output_prefix = os.path.join(os.path.abspath(output_dir), '')
+    jobs = []
+    skipped = not_images = 0
+    for image_path in traversal.iter_files(
+            input_path, **(traversal_options or {})):
+        if os.path.abspath(image_path).startswith(output_prefix):
+            continue
+        if not is_input_file(image_path, bool(max_memory)):
+            not_images += 1
+            continue
+
+        output_path = get_output_path(image_path, input_path, output_dir)
+        if resume and run_log.is_done(output_path, settings_digest):
+            skipped += 1
+        else:
+            jobs.append((image_path, output_path))
+
+    start = time.perf_counter()
+    done = failed = pixel_count = 0
+    with run_log, concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers, initializer=init_worker,
+            initargs=(lut_dir,)) as executor:
+        futures = {
+            executor.submit(recolor_file, image_path, output_path, settings):
+                (image_path, output_path)
+            for image_path, output_path in jobs
+        }
+        for future in concurrent.futures.as_completed(futures):
+            image_path, output_path = futures[future]
+            try:
+                pixels, elapsed = future.result()
+            except Exception as ex:
+                failed += 1
+                print('%s: %s' % (image_path, ex), file=sys.stderr)
+                continue
+
+            done += 1
+            pixel_count += pixels
+            run_log.add(output_path, settings_digest)
+            print('%s (%.2f s)' % (image_path, elapsed))
+
+    elapsed = time.perf_counter() - start
+    print()
+    print('recolored: %d, failed: %d, skipped: %d, not images: %d' % (
+        done, failed, skipped, not_images
+    ))
+    print('time: %.2f s, %.2f images/s, %.2f Mpx/s' % (
+        elapsed, done / elapsed if elapsed else 0,
+        pixel_count / elapsed / 1e6 if elapsed else 0
+    ))
+    peak_memory = get_peak_memory()
+    if peak_memory is not None:
+        print('peak memory: %.1f MB' % (peak_memory / 2 ** 20))
+
+    return failed == 0
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+import argparse
+import os
+import time
+
+import numpy
+import PIL.Image
+
+import color_lut
+import engine
+
+
+DEFAULT_IMAGE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', 'lab3', 'example.jpg'
+)
+THUMBNAIL_SIZE = (600, 400)
+
+
+def measure(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('image_path', type=str, nargs='?',
+                        default=DEFAULT_IMAGE, help='Path to the image file')
+    parser.add_argument('--from', dest='from_color', type=int, nargs=3,
+                        default=(200, 120, 60), metavar=('R', 'G', 'B'))
+    parser.add_argument('--to', dest='to_color', type=int, nargs=3,
+                        default=(60, 120, 200), metavar=('R', 'G', 'B'))
+    parser.add_argument('--range', dest='range_', type=int, default=60)
+    parser.add_argument('--lut-dir', default=color_lut.DEFAULT_CACHE_DIR)
+    args = parser.parse_args()
+
+    image = PIL.Image.open(args.image_path).convert('RGB')
+    thumbnail = image.copy()
+    thumbnail.thumbnail(THUMBNAIL_SIZE)
+
+    params = (args.from_color, args.to_color, args.range_)
+    thumbnail_pixels = numpy.asarray(thumbnail)
+    full_pixels = numpy.asarray(image)
+
+    expected, reference_time = measure(
+        engine.recolor_pixels_reference, thumbnail_pixels, *params
+    )
+    actual, vectorized_time = measure(
+        engine.recolor_pixels, thumbnail_pixels, *params
+    )
+    print('thumbnail %dx%d' % thumbnail.size)
+    print('  per-pixel:  %8.3f s' % reference_time)
+    print('  vectorized: %8.3f s' % vectorized_time)
+    print('  speedup:    %8.1fx' % (reference_time / vectorized_time))
+    print('  identical:  %s' % numpy.array_equal(expected, actual))
+
+    pixel_count = full_pixels.shape[0] * full_pixels.shape[1]
+    color_count = len(numpy.unique(engine.pack_colors(full_pixels)))
+    expected, full_time = measure(engine.recolor_pixels, full_pixels, *params)
+    actual, unique_time = measure(engine.recolor_unique, full_pixels, *params)
+    print('full image %dx%d, %d distinct colors' % (image.size + (color_count,)))
+    print('  vectorized: %8.3f s (%.1f Mpx/s)' % (
+        full_time, pixel_count / full_time / 1e6
+    ))
+    print('  palette:    %8.3f s (%.1f Mpx/s)' % (
+        unique_time, pixel_count / unique_time / 1e6
+    ))
+    print('  identical:  %s' % numpy.array_equal(expected, actual))
+
+    converter = color_lut.ColorConverter(args.lut_dir)
+    if 'hsv' in converter.tables:
+        actual, lut_time = measure(
+            engine.recolor_pixels, full_pixels, *params,
+            converter=converter
+        )
+        print('  lookup:     %8.3f s (%.1f Mpx/s)' % (
+            lut_time, pixel_count / lut_time / 1e6
+        ))
+        print('  mismatches: %d' % (expected != actual).any(axis=-1).sum())
+    else:
+        print('  lookup:     no tables in %s' % args.lut_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+import argparse
+import time
+
+import numpy
+import PIL.Image
+
+import benchmark
+import color_lut
+import engine
+import metrics
+
+
+IMAGE_SIZES = [(150, 100), (600, 400), (1500, 1000), (3000, 2000)]
+MIN_DURATION = 0.5
+
+
+def get_pixels_per_second(pixels, from_color, metric, converter):
+    pixel_count = pixels.shape[0] * pixels.shape[1]
+    runs = 0
+    start = time.perf_counter()
+    while True:
+        engine.get_distance(pixels, from_color, metric, converter)
+        runs += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= MIN_DURATION:
+            return pixel_count * runs / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('image_path', type=str, nargs='?',
+                        default=benchmark.DEFAULT_IMAGE,
+                        help='Path to the image file')
+    parser.add_argument('--from', dest='from_color', type=int, nargs=3,
+                        default=(200, 120, 60), metavar=('R', 'G', 'B'))
+    parser.add_argument('--metric', choices=list(metrics.METRICS), nargs='+',
+                        default=list(metrics.METRICS))
+    parser.add_argument('--lut-dir', default=color_lut.DEFAULT_CACHE_DIR)
+    args = parser.parse_args()
+
+    image = PIL.Image.open(args.image_path).convert('RGB')
+    converters = [('on the fly', None)]
+    converter = color_lut.ColorConverter(args.lut_dir)
+    if converter.tables:
+        converters.append(('lookup', converter))
+
+    print('%-12s %-11s %12s %12s' % ('metric', 'conversion', 'size', 'Mpx/s'))
+    for metric in args.metric:
+        for converter_name, converter in converters:
+            if converter is not None and \
+                    metrics.get_metric(metric).space not in converter.tables:
+                continue
+            for size in IMAGE_SIZES:
+                pixels = numpy.asarray(image.resize(size))
+                speed = get_pixels_per_second(
+                    pixels, args.from_color, metric, converter
+                )
+                print('%-12s %-11s %12s %12.2f' % (
+                    metric, converter_name, '%dx%d' % size, speed / 1e6
+                ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+import argparse
+import json
+import os
+import sys
+
+import numpy
+import numpy.lib.format
+
+import engine
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'common'))
+import checksums
+
+
+LUT_VERSION = 1
+LUT_SIZE = 1 << 24
+BUILD_CHUNK_SIZE = 1 << 20
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    'RECOLOR_LUT_DIR',
+    os.path.join(os.path.expanduser('~'), '.cache', 'recolor_lut')
+)
+
+
+def get_lut_paths(space, cache_dir):
+    base_path = os.path.join(cache_dir, 'rgb_to_%s' % space)
+    return base_path + '.npy', base_path + '.json'
+
+
+def build_lut(space, cache_dir=DEFAULT_CACHE_DIR, dtype='float32'):
+    convert = engine.COLOR_SPACES[space]
+    table_path, meta_path = get_lut_paths(space, cache_dir)
+    os.makedirs(cache_dir, exist_ok=True)
+
+    # Written under a temporary name and renamed afterwards, so an
+    # interrupted build never leaves a table that looks complete.
+    temp_path = table_path + '.tmp'
+    table = numpy.lib.format.open_memmap(
+        temp_path, mode='w+', dtype=numpy.dtype(dtype), shape=(LUT_SIZE, 3)
+    )
+    for start in range(0, LUT_SIZE, BUILD_CHUNK_SIZE):
+        keys = numpy.arange(start, start + BUILD_CHUNK_SIZE, dtype=numpy.uint32)
+        table[start:start + BUILD_CHUNK_SIZE] = convert(
+            engine.unpack_colors(keys)
+        )
+    table.flush()
+    del table
+
+    meta = {
+        'version': LUT_VERSION,
+        'space': space,
+        'dtype': numpy.dtype(dtype).name,
+        'shape': [LUT_SIZE, 3],
+        'sha256': checksums.get_file_checksum(temp_path),
+    }
+    os.replace(temp_path, table_path)
+    with open(meta_path, 'w') as file:
+        json.dump(meta, file, indent=2)
+
+    return meta
+
+
+def read_lut_meta(space, cache_dir=DEFAULT_CACHE_DIR):
+    table_path, meta_path = get_lut_paths(space, cache_dir)
+    try:
+        with open(meta_path) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def check_lut(space, cache_dir=DEFAULT_CACHE_DIR, verify=False):
+    table_path, meta_path = get_lut_paths(space, cache_dir)
+    meta = read_lut_meta(space, cache_dir)
+
+    if meta is None or not os.path.exists(table_path):
+        return 'missing'
+    if meta.get('version') != LUT_VERSION or meta.get('space') != space:
+        return 'outdated'
+    if verify and \
+            checksums.get_file_checksum(table_path) != meta.get('sha256'):
+        return 'corrupted'
+    return 'ok'
+
+
+def load_lut(space, cache_dir=DEFAULT_CACHE_DIR, verify=False):
+    if check_lut(space, cache_dir, verify) != 'ok':
+        return None
+
+    table_path, meta_path = get_lut_paths(space, cache_dir)
+    meta = read_lut_meta(space, cache_dir)
+    try:
+        table = numpy.load(table_path, mmap_mode='r')
+    except (OSError, ValueError):
+        return None
+
+    if list(table.shape) != meta['shape'] or table.dtype.name != meta['dtype']:
+        return None
+    return table
+
+
+class ColorConverter:
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, verify=False):
+        self.tables = {}
+        for space in engine.COLOR_SPACES:
+            table = load_lut(space, cache_dir, verify)
+            if table is not None:
+                self.tables[space] = table
+
+    def convert(self, space, pixels):
+        table = self.tables.get(space)
+        if table is None:
+            return engine.COLOR_SPACES[space](pixels)
+
+        keys = engine.pack_colors(numpy.asarray(pixels))
+        return table[keys].astype(numpy.float64)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Build or check the RGB lookup tables used by recolor.py'
+    )
+    parser.add_argument('command', choices=('build', 'verify', 'status'))
+    parser.add_argument('--space', choices=sorted(engine.COLOR_SPACES),
+                        nargs='+', default=sorted(engine.COLOR_SPACES))
+    parser.add_argument('--dtype', choices=('float16', 'float32'),
+                        default='float32')
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR)
+    args = parser.parse_args()
+
+    for space in args.space:
+        if args.command == 'build':
+            meta = build_lut(space, args.cache_dir, args.dtype)
+            print('%s: built %s table, sha256 %s' % (
+                space, meta['dtype'], meta['sha256']
+            ))
+        else:
+            status = check_lut(space, args.cache_dir,
+                               verify=args.command == 'verify')
+            print('%s: %s' % (space, status))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,248 @@
+import numpy
+import PIL.Image
+import PIL.JpegImagePlugin
+from colormath import color_constants
+from colormath.color_objects import sRGBColor, HSVColor
+from colormath.color_conversions import convert_color
+
+import metrics
+
+
+RECOLOR_MODES = ('auto', 'pixel', 'palette')
+
+
+def cap_number(number, min_, max_):
+    if number < min_:
+        return min_
+    elif number > max_:
+        return max_
+    else:
+        return number
+
+
+def barkovsky_distance_3000(hsv1, hsv2):
+    return (
+        abs(hsv1.hsv_h - hsv2.hsv_h) +
+        abs(hsv1.hsv_s - hsv2.hsv_s) * 0.25 +
+        abs(hsv1.hsv_v - hsv2.hsv_v) * 0.25
+    )
+
+
+def rgb_to_hsv(pixels):
+    # Same formulas (and operation order) as colormath's RGB_to_HSV applied
+    # to sRGBColor(r, g, b) with 0..255 values, so the results are identical.
+    rgb = numpy.asarray(pixels, dtype=numpy.float64)
+    r, g, b = rgb[..., 0], rgb[..., 1], rgb[..., 2]
+
+    max_ = numpy.maximum(numpy.maximum(r, g), b)
+    min_ = numpy.minimum(numpy.minimum(r, g), b)
+    gray = max_ == min_
+    delta = numpy.where(gray, 1, max_ - min_)
+
+    hue = numpy.where(
+        max_ == r,
+        (60.0 * ((g - b) / delta) + 360) % 360.0,
+        numpy.where(
+            max_ == g,
+            60.0 * ((b - r) / delta) + 120,
+            60.0 * ((r - g) / delta) + 240.0
+        )
+    )
+    hue = numpy.where(gray, 0.0, hue)
+
+    black = max_ == 0
+    saturation = numpy.where(
+        black, 0.0, 1.0 - min_ / numpy.where(black, 1, max_)
+    )
+
+    return numpy.stack((hue, saturation, max_), axis=-1)
+
+
+def rgb_to_lab(pixels):
+    # Vectorized convert_color(sRGBColor(r, g, b, is_upscaled=True),
+    # LabColor) using colormath's own matrix and D65 white point.
+    rgb = numpy.asarray(pixels, dtype=numpy.float64) / 255.0
+    linear = numpy.where(
+        rgb <= 0.04045, rgb / 12.92, ((rgb + 0.055) / 1.055) ** 2.4
+    )
+
+    xyz = linear @ sRGBColor.conversion_matrices['rgb_to_xyz'].T
+    xyz /= color_constants.ILLUMINANTS['2']['d65']
+    xyz = numpy.where(
+        xyz > color_constants.CIE_E,
+        numpy.cbrt(xyz), 7.787 * xyz + 16.0 / 116.0
+    )
+    x, y, z = xyz[..., 0], xyz[..., 1], xyz[..., 2]
+
+    return numpy.stack(
+        (116.0 * y - 16.0, 500.0 * (x - y), 200.0 * (y - z)), axis=-1
+    )
+
+
+COLOR_SPACES = {
+    'hsv': rgb_to_hsv,
+    'lab': rgb_to_lab,
+}
+
+
+def convert_pixels(space, pixels, converter=None):
+    if space == 'rgb':
+        return numpy.asarray(pixels, dtype=numpy.float64)
+    if converter is not None:
+        return converter.convert(space, pixels)
+    return COLOR_SPACES[space](pixels)
+
+
+def get_distance(pixels, from_color, metric=metrics.DEFAULT_METRIC,
+                 converter=None):
+    metric = metrics.get_metric(metric)
+    from_value = convert_pixels(metric.space, numpy.array(from_color))
+    values = convert_pixels(metric.space, pixels, converter)
+    return metric.distance(values, from_value)
+
+
+def shift_colors(pixels, from_color, to_color):
+    shift = numpy.subtract(to_color, from_color, dtype=numpy.int16)
+    shifted = pixels.astype(numpy.int16) + shift
+    return numpy.clip(shifted, 0, 255).astype(numpy.uint8)
+
+
+def recolor_pixels(pixels, from_color, to_color, range_,
+                   metric=metrics.DEFAULT_METRIC, converter=None):
+    pixels = numpy.asarray(pixels, dtype=numpy.uint8)
+    mask = get_distance(pixels, from_color, metric, converter) <= range_
+
+    result = pixels.copy()
+    result[mask] = shift_colors(pixels[mask], from_color, to_color)
+    return result
+
+
+def recolor_pixels_reference(pixels, from_color, to_color, range_):
+    # The original per-pixel implementation, kept to check the vectorized
+    # engine against. Channels are converted to int so that the color shift
+    # does not wrap around in uint8.
+    from_hsv = convert_color(sRGBColor(*from_color), HSVColor)
+    from_r, from_g, from_b = from_color
+    to_r, to_g, to_b = to_color
+
+    height, width = pixels.shape[:2]
+    result = numpy.empty((height, width, 3), dtype=numpy.uint8)
+
+    for i in range(width):
+        for j in range(height):
+            r, g, b = (int(c) for c in pixels[j, i][:3])
+            hsv_pixel = convert_color(sRGBColor(r, g, b), HSVColor)
+            distance = barkovsky_distance_3000(hsv_pixel, from_hsv)
+
+            # distance = delta_e_cie2000(lab_pixel, from_lab)
+
+            # distance = math.sqrt(
+            #     (r - from_r) ** 2 +
+            #     (g - from_g) ** 2 +
+            #     (b - from_b) ** 2
+            # )
+
+            if distance > range_:
+                result[j, i] = (r, g, b)
+                continue
+
+            result[j, i] = (
+                cap_number(to_r + r - from_r, 0, 255),
+                cap_number(to_g + g - from_g, 0, 255),
+                cap_number(to_b + b - from_b, 0, 255),
+            )
+
+    return result
+
+
+def pack_colors(pixels):
+    pixels = pixels.astype(numpy.uint32)
+    return (pixels[..., 0] << 16) | (pixels[..., 1] << 8) | pixels[..., 2]
+
+
+def unpack_colors(keys):
+    return numpy.stack(
+        (keys >> 16, (keys >> 8) & 0xFF, keys & 0xFF), axis=-1
+    ).astype(numpy.uint8)
+
+
+def recolor_unique(pixels, from_color, to_color, range_,
+                   metric=metrics.DEFAULT_METRIC, converter=None):
+    # Every distinct color is recolored once and the results are scattered
+    # back through the inverse index, so the cost depends on the palette
+    # size rather than on the pixel count.
+    pixels = numpy.asarray(pixels, dtype=numpy.uint8)
+    keys, inverse = numpy.unique(pack_colors(pixels).ravel(),
+                                 return_inverse=True)
+    colors = recolor_pixels(unpack_colors(keys), from_color, to_color, range_,
+                            metric, converter)
+    return colors[inverse.ravel()].reshape(pixels.shape)
+
+
+def recolor_palette_image(image, from_color, to_color, range_,
+                          metric=metrics.DEFAULT_METRIC, converter=None):
+    palette = numpy.array(image.getpalette(), dtype=numpy.uint8)
+    palette = palette.reshape(-1, 3)
+
+    result = image.copy()
+    result.putpalette(
+        recolor_pixels(
+            palette, from_color, to_color, range_, metric, converter
+        ).tobytes()
+    )
+    return result
+
+
+def recolor_image(image, from_color, to_color, range_, mode='auto',
+                  metric=metrics.DEFAULT_METRIC, converter=None):
+    if mode not in RECOLOR_MODES:
+        raise ValueError('Unknown recolor mode: %s' % mode)
+
+    if image.mode in ('P', 'PA') and mode in ('auto', 'palette'):
+        return recolor_palette_image(image, from_color, to_color, range_,
+                                     metric, converter)
+
+    # Only the color bands are recolored; an alpha band is put back as it
+    # was.
+    bands = image.getbands()
+    alpha = image.split()[bands.index('A')] if 'A' in bands else None
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+
+    if mode == 'palette':
+        recolor = recolor_unique
+    else:
+        recolor = recolor_pixels
+
+    result = recolor(numpy.asarray(image), from_color, to_color, range_,
+                     metric, converter)
+    result = PIL.Image.fromarray(result, 'RGB')
+    if alpha is not None:
+        result.putalpha(alpha)
+    return result
+
+
+def save_recolored(result, image, path):
+    # The recolored image is saved in the mode and format of the original,
+    # with its EXIF data (orientation included), its color profile and, for
+    # JPEG, its quantization tables, so it is encoded at the same quality.
+    if result.mode != image.mode:
+        try:
+            if image.mode == 'P':
+                result = result.convert('P', palette=PIL.Image.ADAPTIVE)
+            else:
+                result = result.convert(image.mode)
+        except ValueError:
+            # Modes PIL can't convert RGB back to are saved as RGB.
+            pass
+
+    options = {}
+    for name in ('exif', 'icc_profile'):
+        if image.info.get(name):
+            options[name] = image.info[name]
+    if image.format == 'JPEG':
+        options['qtables'] = image.quantization
+        subsampling = PIL.JpegImagePlugin.get_sampling(image)
+        if subsampling != -1:
+            options['subsampling'] = subsampling
+    result.save(path, format=image.format, **options)
@@ -0,0 +1,46 @@
+import collections
+
+import numpy
+from colormath import color_diff_matrix
+
+
+Metric = collections.namedtuple('Metric', ['name', 'space', 'distance'])
+
+METRICS = collections.OrderedDict()
+DEFAULT_METRIC = 'barkovsky'
+
+
+def register_metric(name, space):
+    def decorator(distance):
+        METRICS[name] = Metric(name, space, distance)
+        return distance
+    return decorator
+
+
+def get_metric(name):
+    try:
+        return METRICS[name]
+    except KeyError:
+        raise ValueError('Unknown distance metric: %s' % name)
+
+
+@register_metric('barkovsky', 'hsv')
+def barkovsky_distance_3000_array(hsv, from_hsv):
+    return (
+        numpy.abs(hsv[..., 0] - from_hsv[0]) +
+        numpy.abs(hsv[..., 1] - from_hsv[1]) * 0.25 +
+        numpy.abs(hsv[..., 2] - from_hsv[2]) * 0.25
+    )
+
+
+@register_metric('cie2000', 'lab')
+def delta_e_cie2000_array(lab, from_lab):
+    distance = color_diff_matrix.delta_e_cie2000(
+        numpy.asarray(from_lab), lab.reshape(-1, 3)
+    )
+    return distance.reshape(lab.shape[:-1])
+
+
+@register_metric('euclidean', 'rgb')
+def euclidean_distance_array(rgb, from_rgb):
+    return numpy.sqrt(numpy.sum((rgb - from_rgb) ** 2, axis=-1))
@@ -1,47 +1,51 @@
 #!/usr/bin/env python
 import argparse
+import concurrent.futures
+import os
+import queue
+import sys
 import tkinter as tk
-import math
+import tkinter.messagebox
+import tkinter.ttk as ttk
 
 import numpy
 import PIL.ImageTk
 import PIL.Image
-from colormath.color_objects import sRGBColor, LabColor, HSVColor
-from colormath.color_conversions import convert_color
-from colormath.color_diff import delta_e_cie2000
 
+import batch
+import color_lut
+import engine
+import metrics
+import tiled
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'common'))
+import traversal
 
-IMAGE_SIZE = (600, 400)
-
-
-def cap_number(number, min_, max_):
-    if number < min_:
-        return min_
-    elif number > max_:
-        return max_
-    else:
-        return number
 
-
-def barkovsky_distance_3000(hsv1, hsv2):
-    return (
-        abs(hsv1.hsv_h - hsv2.hsv_h) +
-        abs(hsv1.hsv_s - hsv2.hsv_s) * 0.25 +
-        abs(hsv1.hsv_v - hsv2.hsv_v) * 0.25
-    )
+IMAGE_SIZE = (600, 400)
+PREVIEW_SCALE = 4
+DEBOUNCE_MS = 150
+POLL_MS = 40
+TILE_MEMORY = 4 * 2 ** 20
 
 
 class RecolorWindow:
-    def __init__(self, image_path):
+    def __init__(self, image_path, mode='auto',
+                 metric=metrics.DEFAULT_METRIC, converter=None):
         self.root = tk.Tk()
 
+        self.mode = mode
+        self.converter = converter
+
         self.image = PIL.Image.open(image_path)
 
         self._original_tk_image = None
         self._result_tk_image = None
 
-        self._from_lab = None
-        self._to_lab = None
+        self._debounce_id = None
+        self._generation = 0
+        self._results = queue.Queue()
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
 
         self.label_original = tk.Label(self.root)
         self.label_original.grid(row=0, column=0, columnspan=3)
@@ -93,9 +97,26 @@ class RecolorWindow:
         )
         self.range_scale.grid(row=2, column=0, sticky='nsew')
 
+        self.metric_var = tk.StringVar(self.root, value=metric)
+        self.metric_menu = tk.OptionMenu(
+            self.root, self.metric_var, *metrics.METRICS
+        )
+        self.metric_menu.grid(row=2, column=1, sticky='nsew')
+
         self.button = tk.Button(self.root, text="Recolor", command=self.recolor)
         self.button.grid(row=3, column=0, sticky='nsew')
 
+        self.progress_bar = ttk.Progressbar(self.root, maximum=1.0)
+        self.progress_bar.grid(row=3, column=1, columnspan=5, sticky='ew')
+
+        for scale in (self.from_r_scale, self.from_g_scale, self.from_b_scale,
+                      self.to_r_scale, self.to_g_scale, self.to_b_scale,
+                      self.range_scale):
+            scale.config(command=self.schedule_recolor)
+        self.metric_var.trace_add('write', self.schedule_recolor)
+
+        self.root.after(POLL_MS, self.poll_results)
+
     def set_original_image(self, image):
         scaled_image = image.copy()
         scaled_image.thumbnail(IMAGE_SIZE)
@@ -129,64 +150,153 @@ class RecolorWindow:
     def range(self):
         return self.range_scale.get()
 
+    @property
+    def metric(self):
+        return self.metric_var.get()
+
+    def schedule_recolor(self, *args):
+        # Slider drags fire a command for every step, so the recolor only
+        # starts once the values have stopped changing for a moment.
+        if self._debounce_id is not None:
+            self.root.after_cancel(self._debounce_id)
+        self._debounce_id = self.root.after(DEBOUNCE_MS, self.recolor)
+
     def recolor(self):
-        from_lab = convert_color(sRGBColor(*self.from_color), LabColor)
-        from_hsv = convert_color(sRGBColor(*self.from_color), HSVColor)
-        self._to_lab = convert_color(sRGBColor(*self.to_color), LabColor)
-        range_ = self.range
-        from_r, from_g, from_b = self.from_color
-        to_r, to_g, to_b = self.to_color
-
-        width, height = self.image.width, self.image.height
-        pixel_count = width * height
-        source_pixels = numpy.asarray(self.image)
-
-        result_image = PIL.Image.new('RGB', (width, height), "black")
-        target_pixels = result_image.load()
-
-        pixels_done = 0
-        for i in range(width):
-            for j in range(height):
-                r, g, b = source_pixels[j, i]
-                hsv_pixel = convert_color(sRGBColor(r, g, b), HSVColor)
-                distance = barkovsky_distance_3000(hsv_pixel, from_hsv)
-
-                #distance = delta_e_cie2000(lab_pixel, from_lab)
-
-                # distance = math.sqrt(
-                #     (r - from_r) ** 2 +
-                #     (g - from_g) ** 2 +
-                #     (b - from_b) ** 2
-                # )
-
-                pixels_done += 1
-                if pixels_done % 10000 == 0:
-                    print('%d%%' % (pixels_done / pixel_count * 100))
-
-                if distance > range_:
-                    target_pixels[i, j] = (r, g, b)
+        if self._debounce_id is not None:
+            self.root.after_cancel(self._debounce_id)
+            self._debounce_id = None
+
+        self._generation += 1
+        settings = {
+            'from_color': self.from_color,
+            'to_color': self.to_color,
+            'range_': self.range,
+            'mode': self.mode,
+            'metric': self.metric,
+            'converter': self.converter,
+        }
+        self._executor.submit(self.recolor_job, self._generation, settings)
+
+    def is_stale(self, generation):
+        return generation != self._generation
+
+    def recolor_job(self, generation, settings):
+        try:
+            self.run_recolor_job(generation, settings)
+        except Exception as ex:
+            self._results.put((generation, 1.0, None, ex))
+
+    def run_recolor_job(self, generation, settings):
+        if self.is_stale(generation):
+            return
+
+        width, height = self.image.size
+        preview_size = (max(1, width // PREVIEW_SCALE),
+                        max(1, height // PREVIEW_SCALE))
+        preview = engine.recolor_image(
+            self.image.resize(preview_size), **settings
+        )
+        self._results.put((generation, 0.0, preview, None))
+
+        if self.image.mode == 'P' and settings['mode'] != 'pixel':
+            result = engine.recolor_image(self.image, **settings)
+            self._results.put((generation, 1.0, result, None))
+            return
+
+        pixels = numpy.asarray(self.image.convert('RGB'))
+        output = numpy.empty_like(pixels)
+        tiles = list(tiled.get_tiles(width, height, TILE_MEMORY))
+        for i, tile in enumerate(tiles):
+            if self.is_stale(generation):
+                return
+            tiled.recolor_tiled(pixels[tile], output[tile],
+                                max_memory=TILE_MEMORY, **settings)
+            self._results.put((generation, (i + 1) / len(tiles), None, None))
+
+        result = PIL.Image.fromarray(output, 'RGB')
+        self._results.put((generation, 1.0, result, None))
+
+    def poll_results(self):
+        try:
+            while True:
+                generation, progress, image, error = \
+                    self._results.get_nowait()
+                if self.is_stale(generation):
                     continue
 
-                r_diff = r - from_r
-                g_diff = g - from_g
-                b_diff = b - from_b
+                self.progress_bar['value'] = progress
+                if error is not None:
+                    tkinter.messagebox.showerror('Error', str(error))
+                elif image is not None:
+                    self.set_result_image(image.resize(self.image.size))
+        except queue.Empty:
+            pass
 
-                r_new = cap_number(to_r + r_diff, 0, 255)
-                g_new = cap_number(to_g + g_diff, 0, 255)
-                b_new = cap_number(to_b + b_diff, 0, 255)
-                target_pixels[i, j] = (
-                    int(r_new), int(g_new), int(b_new)
-                )
-
-        self.set_result_image(result_image)
+        self.root.after(POLL_MS, self.poll_results)
 
 
 def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument('image_path', type=str, help='Path to the image file')
+    parser.add_argument('image_path', type=str,
+                        help='Path to the image file (or a folder with images '
+                             'when --output is given)')
+    parser.add_argument(
+        '--mode', choices=engine.RECOLOR_MODES, default='auto',
+        help='"pixel" recolors every pixel, "palette" recolors every '
+             'distinct color once, "auto" uses the palette of P images'
+    )
+    parser.add_argument('--metric', choices=list(metrics.METRICS),
+                        default=metrics.DEFAULT_METRIC,
+                        help='Color distance metric compared with the range')
+    parser.add_argument(
+        '--lut-dir', default=color_lut.DEFAULT_CACHE_DIR,
+        help='Directory with the lookup tables built by color_lut.py; '
+             'colors are converted on the fly if they are missing'
+    )
+    parser.add_argument('--verify-lut', action='store_true',
+                        help='Check the lookup table checksums on startup')
+
+    headless = parser.add_argument_group(
+        'headless mode', 'Recolor full-resolution images without a window'
+    )
+    headless.add_argument('--output', type=str,
+                          help='Folder to write the recolored images to')
+    headless.add_argument('--from', dest='from_color', type=int, nargs=3,
+                          default=(0, 0, 0), metavar=('R', 'G', 'B'))
+    headless.add_argument('--to', dest='to_color', type=int, nargs=3,
+                          default=(0, 0, 0), metavar=('R', 'G', 'B'))
+    headless.add_argument('--range', dest='range_', type=int, default=0)
+    headless.add_argument('--workers', type=int, default=None,
+                          help='Number of worker processes (default: CPUs)')
+    headless.add_argument('--resume', action='store_true',
+                          help='Skip images already recolored with the same '
+                               'settings')
+    headless.add_argument('--max-memory', type=int, default=None,
+                          metavar='MB',
+                          help='Recolor in tiles using at most this much '
+                               'working memory per image; .npy and .ppm '
+                               'outputs are memory-mapped')
+    traversal.add_arguments(parser)
     args = parser.parse_args()
 
-    window = RecolorWindow(args.image_path)
+    if args.output:
+        try:
+            succeeded = batch.run_batch(
+                args.image_path, args.output,
+                args.from_color, args.to_color, args.range_,
+                mode=args.mode, metric=args.metric, workers=args.workers,
+                resume=args.resume, lut_dir=args.lut_dir,
+                max_memory=args.max_memory and args.max_memory * 2 ** 20,
+                traversal_options=traversal.get_options(args),
+                verify_lut=args.verify_lut
+            )
+        except ValueError as ex:
+            parser.error(str(ex))
+        raise SystemExit(0 if succeeded else 1)
+
+    converter = color_lut.ColorConverter(args.lut_dir, args.verify_lut)
+    window = RecolorWindow(args.image_path, args.mode, args.metric,
+                           converter)
     window.root.mainloop()
 
 
@@ -0,0 +1,112 @@
+import os
+import sys
+
+import numpy
+import numpy.lib.format
+import PIL.Image
+
+import engine
+import metrics
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'common'))
+import raw_images
+
+
+# Peak temporary memory of the engine per recolored pixel (the CIEDE2000
+# metric is the most expensive one, at about 250 bytes).
+WORKING_BYTES_PER_PIXEL = 256
+DEFAULT_MAX_MEMORY = 64 * 2 ** 20
+
+
+def open_pixels(path, image=None):
+    if path.lower().endswith('.npy'):
+        return numpy.load(path, mmap_mode='r')
+
+    if image is None:
+        image = PIL.Image.open(path)
+    pixels = raw_images.map_raw_image(image, ('RGB',))
+    if pixels is None:
+        # Anything that can't be mapped is decoded in one go; only the
+        # recolor itself stays within the memory limit.
+        pixels = numpy.asarray(image.convert('RGB'))
+    return pixels
+
+
+def create_output(path, shape):
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.npy':
+        return numpy.lib.format.open_memmap(path, mode='w+',
+                                            dtype=numpy.uint8, shape=shape)
+    if extension == '.ppm':
+        height, width = shape[:2]
+        header = b'P6\n%d %d\n255\n' % (width, height)
+        with open(path, 'wb') as file:
+            file.write(header)
+            file.truncate(len(header) + height * width * 3)
+        return numpy.memmap(path, dtype=numpy.uint8, mode='r+',
+                            offset=len(header), shape=shape)
+    return numpy.empty(shape, dtype=numpy.uint8)
+
+
+def get_tiles(width, height, max_memory):
+    max_pixels = max(1, max_memory // WORKING_BYTES_PER_PIXEL)
+    tile_width = min(width, max_pixels)
+    tile_height = max(1, max_pixels // tile_width)
+
+    for y in range(0, height, tile_height):
+        for x in range(0, width, tile_width):
+            yield (
+                slice(y, min(y + tile_height, height)),
+                slice(x, min(x + tile_width, width)),
+            )
+
+
+def recolor_tiled(pixels, output, from_color, to_color, range_, mode='auto',
+                  metric=metrics.DEFAULT_METRIC, converter=None,
+                  max_memory=DEFAULT_MAX_MEMORY):
+    recolor = engine.recolor_unique if mode == 'palette' else \
+        engine.recolor_pixels
+
+    height, width = pixels.shape[:2]
+    for rows, columns in get_tiles(width, height, max_memory):
+        output[rows, columns] = recolor(
+            pixels[rows, columns], from_color, to_color, range_,
+            metric, converter
+        )
+    return output
+
+
+def recolor_file_tiled(input_path, output_path, from_color, to_color, range_,
+                       mode='auto', metric=metrics.DEFAULT_METRIC,
+                       converter=None, max_memory=DEFAULT_MAX_MEMORY):
+    image = None
+    if not input_path.lower().endswith('.npy'):
+        image = PIL.Image.open(input_path)
+
+        # Rewriting a palette needs no pixel memory, so palette images get
+        # the same result as without tiles.
+        if image.mode in ('P', 'PA') and mode in ('auto', 'palette'):
+            result = engine.recolor_palette_image(
+                image, from_color, to_color, range_, metric, converter
+            )
+            engine.save_recolored(result, image, output_path)
+            return image.width * image.height
+
+    pixels = open_pixels(input_path, image)
+    output = create_output(output_path, pixels.shape)
+
+    recolor_tiled(pixels, output, from_color, to_color, range_, mode, metric,
+                  converter, max_memory)
+
+    if isinstance(output, numpy.memmap):
+        output.flush()
+    elif image is None:
+        PIL.Image.fromarray(output, 'RGB').save(output_path)
+    else:
+        result = PIL.Image.fromarray(output, 'RGB')
+        bands = image.getbands()
+        if 'A' in bands:
+            result.putalpha(image.split()[bands.index('A')])
+        engine.save_recolored(result, image, output_path)
+
+    return pixels.shape[0] * pixels.shape[1]
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+import argparse
+import glob
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+import numpy
+import PIL.Image
+
+import histogram
+import pcx
+
+
+IMAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'imgs')
+
+
+def count_with_pil(image_path):
+    with PIL.Image.open(image_path) as image:
+        return histogram.get_histograms(image)[1]
+
+
+def count_with_pcx(image_path):
+    accumulator = histogram.HistogramAccumulator()
+    accumulator.update_pcx(pcx.PcxReader(image_path))
+    return accumulator.counts
+
+
+METHODS = {
+    'none': lambda image_path: numpy.zeros((1, 1), dtype=numpy.int64),
+    'pil': count_with_pil,
+    'pcx': count_with_pcx,
+}
+
+
+def run_method(method, image_path):
+    # Runs in a fresh process, so that ru_maxrss only reflects this method.
+    start = time.perf_counter()
+    counts = METHODS[method](image_path)
+    elapsed = time.perf_counter() - start
+    print(json.dumps({
+        'time': elapsed,
+        'peak_rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'checksum': int(numpy.dot(counts.ravel(), numpy.arange(counts.size))),
+    }))
+
+
+def measure_method(method, image_path):
+    output = subprocess.check_output([
+        sys.executable, os.path.abspath(__file__), '--run', method, image_path
+    ])
+    return json.loads(output.decode())
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('image_paths', type=str, nargs='*',
+                        default=sorted(glob.glob(os.path.join(IMAGES_DIR,
+                                                              '*.pcx'))),
+                        help='PCX files to decode')
+    parser.add_argument('--run', choices=sorted(METHODS),
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        run_method(args.run, args.image_paths[0])
+        return
+
+    baseline = measure_method('none', os.devnull)
+    print('interpreter and imports alone: %.1f MB peak RSS' %
+          (baseline['peak_rss'] / 1024))
+    print('%-32s %-6s %10s %14s %6s' % ('file', 'method', 'time, s',
+                                        'peak RSS, MB', 'same'))
+    for image_path in args.image_paths:
+        results = {method: measure_method(method, image_path)
+                   for method in ('pil', 'pcx')}
+        for method, result in sorted(results.items()):
+            print('%-32s %-6s %10.3f %14.1f %6s' % (
+                os.path.basename(image_path), method, result['time'],
+                result['peak_rss'] / 1024,
+                result['checksum'] == results['pil']['checksum']
+            ))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,101 +1,221 @@
 #!/usr/bin/env python
 import argparse
-import statistics
+import os
+import sys
 import tkinter as tk
 
-import numpy
-import matplotlib
-matplotlib.use("TkAgg")
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2TkAgg
-from matplotlib.figure import Figure
 import PIL.ImageTk
 import PIL.Image
 
+import histogram
+import histogram_stats
+import joint_histogram
+import render
+import stats_cache
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'common'))
+import traversal
+
 
 IMAGE_SIZE = (600, 400)
+TK_IMAGE_MODES = ('1', 'L', 'P', 'RGB', 'RGBA')
+SWATCH_COUNT = 8
 
 
 class ColorStatsWindow:
-    def __init__(self, image_path):
+    def __init__(self, image_path, dominant=SWATCH_COUNT,
+                 bits=joint_histogram.DEFAULT_BITS):
         self.root = tk.Tk()
 
-        self.image = PIL.Image.open(image_path).convert('RGB')
+        self.image = PIL.Image.open(image_path)
 
         self.label_original = tk.Label(self.root)
         self.label_original.grid(row=0, column=0)
         self.set_original_image(self.image)
 
-        red_counts, green_counts, blue_counts = self.get_color_stats()
-        red_mean = statistics.mean(self.get_values_from_counts(red_counts))
-        green_mean = statistics.mean(self.get_values_from_counts(green_counts))
-        blue_mean = statistics.mean(self.get_values_from_counts(blue_counts))
-        print('red mean: %.2f' % red_mean)
-        print('green mean: %.2f' % green_mean)
-        print('blue mean: %.2f' % blue_mean)
-
-        red_figure = self.draw_figure(red_counts, red_mean, 'r')
-        green_figure = self.draw_figure(green_counts, green_mean, 'g')
-        blue_figure = self.draw_figure(blue_counts, blue_mean, 'b')
+        bands, counts = self.get_color_stats()
+        for index, (band, band_counts) in enumerate(zip(bands, counts)):
+            mean = histogram_stats.mean(band_counts)
+            print('%s mean: %.2f' % (histogram.BAND_NAMES.get(band, band), mean))
 
-        red_canvas = self.get_tk_canvas(red_figure)
-        green_canvas = self.get_tk_canvas(green_figure)
-        blue_canvas = self.get_tk_canvas(blue_figure)
+            figure = render.draw_figure(
+                band_counts, mean, histogram.BAND_COLORS.get(band, 'k')
+            )
+            canvas = self.get_tk_canvas(figure)
+            row, column = divmod(index + 1, 2)
+            canvas.grid(row=row, column=column)
 
-        red_canvas.grid(row=0, column=1)
-        green_canvas.grid(row=1, column=0)
-        blue_canvas.grid(row=1, column=1)
+        self.frame_swatches = tk.Frame(self.root)
+        self.frame_swatches.grid(row=3, column=0, columnspan=2)
+        joint = joint_histogram.accumulate_image_file(image_path, bits)
+        self.set_swatches(joint.top_colors(dominant))
 
     def set_original_image(self, image):
         scaled_image = image.copy()
         scaled_image.thumbnail(IMAGE_SIZE)
+        if scaled_image.mode not in TK_IMAGE_MODES:
+            scaled_image = scaled_image.convert('RGB')
 
         self._scaled_tk_image = PIL.ImageTk.PhotoImage(scaled_image)
         self.label_original.config(image=self._scaled_tk_image)
 
+    def set_swatches(self, dominant_colors):
+        for index, dominant in enumerate(dominant_colors):
+            color = get_hex_color(dominant.color)
+            swatch = tk.Label(self.frame_swatches, width=12, height=3,
+                              background=color,
+                              text='%s\n%.1f%%' % (color,
+                                                   dominant.fraction * 100))
+            # Dark swatches get white text.
+            if sum(dominant.color) < 384:
+                swatch.config(foreground='white')
+            swatch.grid(row=0, column=index)
+
     def get_tk_canvas(self, figure):
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+
         canvas = FigureCanvasTkAgg(figure, self.root)
-        canvas.show()
+        canvas.draw()
         return canvas.get_tk_widget()
 
-    def draw_figure(self, counts, mean, plot_color):
-        figure = Figure(figsize=(8, 5.3333333), dpi=75)
-        plot = figure.add_subplot(111)
-        plot.set_xlim([0, 255])
-        plot.plot(range(0, 256), counts, color=plot_color)
-        plot.axvline(mean, color='purple')
-        return figure
-
     def get_color_stats(self):
-        width, height = self.image.width, self.image.height
-
-        red_counts = [0] * 256
-        green_counts = [0] * 256
-        blue_counts = [0] * 256
-
-        for i in range(width):
-            for j in range(height):
-                r, g, b = self.image.getpixel((i, j))
-                red_counts[r] += 1
-                green_counts[g] += 1
-                blue_counts[b] += 1
-
-        return red_counts, green_counts, blue_counts
-
-    @staticmethod
-    def get_values_from_counts(counts):
-        values = []
-        for v, count in enumerate(counts):
-            values.extend([v] * count)
-        return values
+        return histogram.get_histograms(self.image)
+
+
+def get_hex_color(color):
+    return '#%02x%02x%02x' % color
+
+
+def print_dominant_colors(joint, count):
+    print('%d dominant colors (%d bits per channel, %d distinct)' % (
+        count, joint.bits, len(joint)
+    ))
+    print('%-8s %-15s %12s %8s' % ('color', 'rgb', 'pixels', 'share'))
+    for dominant in joint.top_colors(count):
+        print('%-8s %-15s %12d %7.2f%%' % (
+            get_hex_color(dominant.color), '%d,%d,%d' % dominant.color,
+            dominant.count, dominant.fraction * 100
+        ))
+    print()
+
+
+def print_report(image_path, bands, counts):
+    print(image_path)
+    print('%-10s %10s %8s %8s %8s %8s %8s %8s %6s' % (
+        'band', 'mean', 'stdev', 'skew', 'median', 'p5', 'p95', 'entropy',
+        'mode'
+    ))
+    for band, band_counts in zip(bands, counts):
+        stats = histogram_stats.describe(band_counts)
+        print('%-10s %10.4f %8.3f %8.3f %8.1f %8.1f %8.1f %8.3f %6d' % (
+            histogram.BAND_NAMES.get(band, band), stats['mean'],
+            stats['stdev'], stats['skewness'], stats['median'], stats['p5'],
+            stats['p95'], stats['entropy'], stats['mode']
+        ))
+    print()
 
 
 def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument('image_path', type=str, help='Path to the image file')
+    parser.add_argument('image_path', type=str,
+                        help='Path to the image file (or a folder with images '
+                             'when --aggregate or --render is given)')
+    parser.add_argument('--report', action='store_true',
+                        help='Print the statistics without opening a window')
+    parser.add_argument('--aggregate', action='store_true',
+                        help='Print the statistics of all images together')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Number of worker processes for --aggregate '
+                             'and --render')
+    parser.add_argument('--dominant', type=int, default=0, metavar='K',
+                        help='Also list the K most frequent colors of the '
+                             'joint RGB histogram (the window shows %d by '
+                             'default)' % SWATCH_COUNT)
+    parser.add_argument('--bits', type=int, choices=range(1, 9),
+                        default=joint_histogram.DEFAULT_BITS,
+                        help='Bits per channel of the joint RGB histogram')
+    parser.add_argument('--load-histogram', type=str, nargs='+', default=[],
+                        metavar='PATH',
+                        help='Merge histograms saved by an earlier run')
+    parser.add_argument('--save-histogram', type=str, metavar='PATH',
+                        help='Save the aggregated histograms (.npz)')
+    parser.add_argument('--cache', type=str,
+                        default=stats_cache.DEFAULT_CACHE_PATH,
+                        help='SQLite file caching the per-image histograms '
+                             'of --report and --aggregate')
+    parser.add_argument('--cache-size', type=int, default=256, metavar='MB',
+                        help='Evict the least recently used cache entries '
+                             'beyond this size')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Decode every image, without the cache')
+    parser.add_argument('--render', type=str, metavar='DIR',
+                        help='Write the histograms of every image to DIR '
+                             'without opening a window')
+    parser.add_argument('--format', choices=render.FORMATS, nargs='+',
+                        default=['png'],
+                        help='Output formats for --render: plots (png, svg) '
+                             'or raw histogram data (json, csv)')
+    traversal.add_arguments(parser)
     args = parser.parse_args()
-
-    window = ColorStatsWindow(args.image_path)
-    window.root.mainloop()
+    traversal_options = traversal.get_options(args)
+
+    def print_error(image_path, ex):
+        print('%s: %s' % (image_path, ex), file=sys.stderr)
+
+    if args.render:
+        written = render.render_paths(args.image_path, args.render,
+                                      args.format, args.workers,
+                                      on_error=print_error,
+                                      traversal_options=traversal_options)
+        print('%d files written to %s' % (len(written), args.render))
+        return
+
+    cache = None
+    if not args.no_cache and (args.report or args.aggregate):
+        cache = stats_cache.StatsCache(args.cache, args.cache_size * 2 ** 20)
+
+    if args.aggregate:
+        groups = histogram.accumulate_paths(
+            traversal.iter_files(args.image_path, **traversal_options),
+            args.workers,
+            on_error=print_error, cache=cache
+        )
+        for path in args.load_histogram:
+            for accumulator in histogram.load_groups(path).values():
+                histogram.merge_into(groups, accumulator)
+        if args.save_histogram:
+            histogram.save_groups(args.save_histogram, groups)
+
+        for accumulator in groups.values():
+            print_report(
+                '%s (%d images)' % (args.image_path, accumulator.image_count),
+                accumulator.bands, accumulator.counts
+            )
+        if args.dominant:
+            print_dominant_colors(joint_histogram.accumulate_paths(
+                traversal.iter_files(args.image_path, **traversal_options),
+                args.bits,
+                args.workers, on_error=print_error
+            ), args.dominant)
+    elif args.report:
+        accumulator = cache and cache.get(args.image_path)
+        if accumulator is None:
+            accumulator = histogram.accumulate_image_file(args.image_path)
+            if cache is not None:
+                cache.put_file(args.image_path, accumulator)
+        print_report(args.image_path, accumulator.bands, accumulator.counts)
+        if args.dominant:
+            print_dominant_colors(joint_histogram.accumulate_image_file(
+                args.image_path, args.bits
+            ), args.dominant)
+    else:
+        window = ColorStatsWindow(args.image_path,
+                                  args.dominant or SWATCH_COUNT, args.bits)
+        window.root.mainloop()
+
+    if cache is not None:
+        print(cache.format_counters(), file=sys.stderr)
+        cache.close()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,259 @@
+import collections
+import concurrent.futures
+import io
+import os
+import sys
+
+import numpy
+import PIL.Image
+
+import pcx
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'common'))
+import raw_images
+
+
+BAND_NAMES = {
+    'R': 'red', 'G': 'green', 'B': 'blue', 'A': 'alpha',
+    'L': 'luminance', 'I': 'intensity', '1': 'bilevel',
+    'C': 'cyan', 'M': 'magenta', 'Y': 'yellow', 'K': 'black',
+}
+BAND_COLORS = {'R': 'r', 'G': 'g', 'B': 'b', 'A': 'gray'}
+DEFAULT_STRIP_HEIGHT = 256
+
+
+def get_bands(image):
+    # Palette images are counted through their palette, so they report the
+    # same R/G/B histograms as their RGB conversion.
+    if image.mode == 'P':
+        return ('R', 'G', 'B')
+    return image.getbands()
+
+
+def get_bin_count(pixels):
+    return 1 << (8 * pixels.dtype.itemsize)
+
+
+def get_pixel_array(image):
+    pixels = numpy.asarray(image)
+    if pixels.dtype == numpy.bool_:
+        pixels = pixels.astype(numpy.uint8) * numpy.uint8(255)
+    if pixels.dtype.kind != 'u' or pixels.dtype.itemsize > 2:
+        raise ValueError('Unsupported image mode: %s' % image.mode)
+    if pixels.ndim == 2:
+        pixels = pixels[..., numpy.newaxis]
+    return pixels
+
+
+def count_bands(pixels, bins=None):
+    if bins is None:
+        bins = get_bin_count(pixels)
+
+    pixels = pixels.reshape(-1, pixels.shape[-1])
+    counts = numpy.empty((pixels.shape[1], bins), dtype=numpy.int64)
+    for band in range(pixels.shape[1]):
+        counts[band] = numpy.bincount(pixels[:, band], minlength=bins)
+    return counts
+
+
+def count_palette(index_counts, palette):
+    palette = numpy.asarray(palette, dtype=numpy.uint8).reshape(-1, 3)
+    index_counts = index_counts[:len(palette)]
+
+    counts = numpy.empty((3, 256), dtype=numpy.int64)
+    for band in range(3):
+        counts[band] = numpy.bincount(
+            palette[:, band], weights=index_counts, minlength=256
+        )
+    return counts
+
+
+def get_histograms(image):
+    pixels = get_pixel_array(image)
+    counts = count_bands(pixels)
+    if image.mode == 'P':
+        counts = count_palette(counts[0], image.getpalette())
+    return get_bands(image), counts
+
+
+def iter_image_strips(image, strip_height=DEFAULT_STRIP_HEIGHT):
+    pixels = raw_images.map_raw_image(image)
+    if pixels is None:
+        # Other images are decoded once and only counted strip by strip.
+        pixels = get_pixel_array(image)
+
+    for y in range(0, pixels.shape[0], strip_height):
+        yield pixels[y:y + strip_height]
+
+
+class HistogramAccumulator:
+    def __init__(self, bands=None, bins=256):
+        self.bands = tuple(bands) if bands else None
+        self.bins = bins
+        self.counts = None
+        self.image_count = 0
+        if self.bands:
+            self.counts = numpy.zeros((len(self.bands), bins), numpy.int64)
+
+    def add_counts(self, bands, counts):
+        bands = tuple(bands)
+        if self.counts is None:
+            self.bands = bands
+            self.bins = counts.shape[1]
+            self.counts = numpy.zeros(counts.shape, numpy.int64)
+        if bands != self.bands or counts.shape != self.counts.shape:
+            raise ValueError('Cannot add %s histograms to %s histograms' % (
+                ''.join(bands), ''.join(self.bands)
+            ))
+        self.counts += counts
+
+    def update(self, pixels, bands):
+        if pixels.ndim == 2:
+            pixels = pixels[..., numpy.newaxis]
+        self.add_counts(bands, count_bands(pixels, get_bin_count(pixels)))
+
+    def update_strips(self, strips, bands, palette=None):
+        counts = None
+        for strip in strips:
+            strip_counts = count_bands(strip)
+            counts = strip_counts if counts is None else counts + strip_counts
+
+        # Palette indices are counted first and mapped once at the end.
+        if palette is not None:
+            counts = count_palette(counts[0], palette)
+
+        self.add_counts(bands, counts)
+        self.image_count += 1
+
+    def update_image(self, image, strip_height=DEFAULT_STRIP_HEIGHT):
+        palette = image.getpalette() if image.mode == 'P' else None
+        self.update_strips(iter_image_strips(image, strip_height),
+                           get_bands(image), palette)
+
+    def update_pcx(self, reader, strip_height=DEFAULT_STRIP_HEIGHT):
+        self.update_strips(reader.iter_strips(strip_height), reader.bands,
+                           reader.palette)
+
+    def merge(self, other):
+        if other.counts is not None:
+            self.add_counts(other.bands, other.counts)
+        self.image_count += other.image_count
+        return self
+
+    def __iadd__(self, other):
+        return self.merge(other)
+
+    def to_bytes(self):
+        buffer = io.BytesIO()
+        numpy.savez_compressed(
+            buffer,
+            bands=numpy.array(self.bands or (), dtype=str),
+            counts=self.counts if self.counts is not None else
+            numpy.zeros((0, self.bins), numpy.int64),
+            image_count=self.image_count,
+        )
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data):
+        with numpy.load(io.BytesIO(data)) as archive:
+            accumulator = cls(bins=archive['counts'].shape[1])
+            if len(archive['bands']):
+                accumulator.add_counts(archive['bands'].tolist(),
+                                       archive['counts'])
+            accumulator.image_count = int(archive['image_count'])
+        return accumulator
+
+    def save(self, path):
+        with open(path, 'wb') as file:
+            file.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as file:
+            return cls.from_bytes(file.read())
+
+
+def accumulate_image_file(image_path, strip_height=DEFAULT_STRIP_HEIGHT):
+    accumulator = HistogramAccumulator()
+    if pcx.is_pcx(image_path):
+        accumulator.update_pcx(pcx.PcxReader(image_path), strip_height)
+    else:
+        with PIL.Image.open(image_path) as image:
+            accumulator.update_image(image, strip_height)
+    return accumulator
+
+
+def accumulate_file(image_path, strip_height=DEFAULT_STRIP_HEIGHT):
+    return accumulate_image_file(image_path, strip_height).to_bytes()
+
+
+def merge_into(groups, accumulator):
+    # Images with different band layouts (RGB, L, CMYK...) can't share a
+    # histogram, so they are reduced into one accumulator per layout.
+    key = ''.join(accumulator.bands)
+    if key in groups:
+        groups[key].merge(accumulator)
+    else:
+        groups[key] = accumulator
+    return groups
+
+
+def accumulate_paths(image_paths, workers=None, on_error=None, cache=None):
+    groups = collections.OrderedDict()
+    pending_paths = []
+    for image_path in image_paths:
+        accumulator = None
+        if cache is not None:
+            try:
+                accumulator = cache.get(image_path)
+            except OSError as ex:
+                if on_error is not None:
+                    on_error(image_path, ex)
+                continue
+        if accumulator is None:
+            pending_paths.append(image_path)
+        else:
+            merge_into(groups, accumulator)
+
+    # With a cache, the workers also hash the files for it.
+    compute = cache.compute_entry if cache is not None else accumulate_file
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(compute, image_path): image_path
+            for image_path in pending_paths
+        }
+        for future in concurrent.futures.as_completed(futures):
+            image_path = futures[future]
+            try:
+                result = future.result()
+            except Exception as ex:
+                if on_error is not None:
+                    on_error(image_path, ex)
+                continue
+
+            if cache is not None:
+                file_key, digest, data = result
+                accumulator = HistogramAccumulator.from_bytes(data)
+                cache.put(file_key, digest, accumulator)
+            else:
+                accumulator = HistogramAccumulator.from_bytes(result)
+            merge_into(groups, accumulator)
+    return groups
+
+
+def save_groups(path, groups):
+    numpy.savez(path, **{
+        key: numpy.frombuffer(accumulator.to_bytes(), dtype=numpy.uint8)
+        for key, accumulator in groups.items()
+    })
+
+
+def load_groups(path):
+    groups = collections.OrderedDict()
+    with numpy.load(path) as archive:
+        for key in archive.files:
+            merge_into(groups, HistogramAccumulator.from_bytes(
+                archive[key].tobytes()
+            ))
+    return groups
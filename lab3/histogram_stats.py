@@ -0,0 +1,98 @@
+import collections
+import math
+
+import numpy
+
+
+# All functions take the counts of a single band: counts[v] is the number of
+# pixels with value v. They run in O(bins), whatever the pixel count.
+
+def get_count(counts):
+    return int(numpy.sum(counts, dtype=numpy.int64))
+
+
+def get_values(counts):
+    return numpy.arange(len(counts), dtype=numpy.int64)
+
+
+def mean(counts):
+    count = get_count(counts)
+    if not count:
+        raise ValueError('mean requires at least one pixel')
+    # Python ints keep the sum exact and int / int is correctly rounded, so
+    # this equals statistics.mean over the expanded values.
+    total = int(numpy.dot(get_values(counts), numpy.asarray(counts, numpy.int64)))
+    return total / count
+
+
+def get_central_moment(counts, order):
+    deviations = get_values(counts) - mean(counts)
+    return float(numpy.dot(deviations ** order, counts)) / get_count(counts)
+
+
+def variance(counts):
+    return get_central_moment(counts, 2)
+
+
+def stdev(counts):
+    return math.sqrt(variance(counts))
+
+
+def skewness(counts):
+    variance_ = variance(counts)
+    if not variance_:
+        return 0.0
+    return get_central_moment(counts, 3) / variance_ ** 1.5
+
+
+def get_value_at_rank(counts, rank):
+    cumulative_counts = numpy.cumsum(counts, dtype=numpy.int64)
+    return int(numpy.searchsorted(cumulative_counts, rank, side='right'))
+
+
+def median(counts):
+    count = get_count(counts)
+    if not count:
+        raise ValueError('median requires at least one pixel')
+    if count % 2:
+        return get_value_at_rank(counts, count // 2)
+    return (
+        get_value_at_rank(counts, count // 2 - 1) +
+        get_value_at_rank(counts, count // 2)
+    ) / 2
+
+
+def percentile(counts, q):
+    # Linear interpolation between the closest ranks, like numpy.percentile.
+    count = get_count(counts)
+    if not count:
+        raise ValueError('percentile requires at least one pixel')
+    position = q / 100 * (count - 1)
+    lower_rank = math.floor(position)
+    lower = get_value_at_rank(counts, lower_rank)
+    upper = get_value_at_rank(counts, min(lower_rank + 1, count - 1))
+    return lower + (upper - lower) * (position - lower_rank)
+
+
+def entropy(counts):
+    counts = numpy.asarray(counts, dtype=numpy.float64)
+    probabilities = counts[counts > 0] / counts.sum()
+    return float(-numpy.sum(probabilities * numpy.log2(probabilities)))
+
+
+def mode(counts):
+    return int(numpy.argmax(counts))
+
+
+def describe(counts):
+    return collections.OrderedDict([
+        ('count', get_count(counts)),
+        ('mean', mean(counts)),
+        ('stdev', stdev(counts)),
+        ('skewness', skewness(counts)),
+        ('median', median(counts)),
+        ('p5', percentile(counts, 5)),
+        ('p95', percentile(counts, 95)),
+        ('entropy', entropy(counts)),
+        ('mode', mode(counts)),
+    ])
@@ -0,0 +1,206 @@
+import collections
+import concurrent.futures
+import io
+
+import numpy
+import PIL.Image
+
+import histogram
+import pcx
+
+
+DEFAULT_BITS = 5
+# Up to 6 bits per channel (2^18 bins, 2 MB of counts) a dense array is
+# cheaper than sorting; above that only the colors present are stored.
+DENSE_MAX_BITS = 6
+
+DominantColor = collections.namedtuple('DominantColor',
+                                       ['color', 'count', 'fraction'])
+
+
+def pack_keys(pixels, bits):
+    shift = 8 - bits
+    pixels = pixels.reshape(-1, pixels.shape[-1]).astype(numpy.uint32)
+    return (
+        ((pixels[:, 0] >> shift) << (2 * bits)) |
+        ((pixels[:, 1] >> shift) << bits) |
+        (pixels[:, 2] >> shift)
+    )
+
+
+def unpack_keys(keys, bits):
+    # Every key stands for the center of its quantization cell.
+    shift = 8 - bits
+    mask = (1 << bits) - 1
+    center = (1 << shift) >> 1
+    keys = numpy.asarray(keys, dtype=numpy.uint32)
+    return numpy.stack((
+        ((keys >> (2 * bits)) & mask) << shift | center,
+        ((keys >> bits) & mask) << shift | center,
+        (keys & mask) << shift | center,
+    ), axis=-1).astype(numpy.uint8)
+
+
+def add_sparse(keys, counts, other_keys, other_counts):
+    keys = numpy.concatenate((keys, other_keys))
+    counts = numpy.concatenate((counts, other_counts))
+    order = numpy.argsort(keys, kind='stable')
+    keys, counts = keys[order], counts[order]
+    starts = numpy.concatenate(([0], numpy.flatnonzero(numpy.diff(keys)) + 1))
+    if not len(keys):
+        return keys, counts
+    return keys[starts], numpy.add.reduceat(counts, starts)
+
+
+def to_rgb(strip):
+    if strip.shape[-1] == 1:
+        return numpy.repeat(strip, 3, axis=-1)
+    return strip[..., :3]
+
+
+class JointHistogram:
+    def __init__(self, bits=DEFAULT_BITS):
+        if not 1 <= bits <= 8:
+            raise ValueError('bits must be between 1 and 8')
+        self.bits = bits
+        self.image_count = 0
+        self._dense = None
+        self._keys = numpy.empty(0, dtype=numpy.uint32)
+        self._counts = numpy.empty(0, dtype=numpy.int64)
+        if bits <= DENSE_MAX_BITS:
+            self._dense = numpy.zeros(1 << (3 * bits), dtype=numpy.int64)
+
+    def add_keys(self, keys, weights=None):
+        if self._dense is not None:
+            self._dense += numpy.bincount(
+                keys, weights=weights, minlength=len(self._dense)
+            ).astype(numpy.int64)
+            return
+
+        if weights is None:
+            keys, counts = numpy.unique(keys, return_counts=True)
+        else:
+            weights = numpy.asarray(weights, numpy.int64)
+            keys, counts = add_sparse(
+                numpy.empty(0, numpy.uint32), numpy.empty(0, numpy.int64),
+                keys[weights > 0], weights[weights > 0]
+            )
+        self._keys, self._counts = add_sparse(
+            self._keys, self._counts, keys.astype(numpy.uint32),
+            counts.astype(numpy.int64)
+        )
+
+    def update(self, pixels):
+        self.add_keys(pack_keys(to_rgb(pixels), self.bits))
+
+    def update_strips(self, strips, palette=None):
+        if palette is None:
+            for strip in strips:
+                self.update(strip)
+        else:
+            # Palette images: count the indices, then add every palette
+            # color once with its index count as the weight.
+            index_counts = sum(histogram.count_bands(strip, 256)[0]
+                               for strip in strips)
+            palette = numpy.asarray(palette, numpy.uint8).reshape(-1, 3)
+            self.add_keys(pack_keys(palette, self.bits),
+                          index_counts[:len(palette)])
+        self.image_count += 1
+
+    def update_image(self, image, strip_height=histogram.DEFAULT_STRIP_HEIGHT):
+        # Premultiplied modes (La, RGBa) only convert to their plain alpha
+        # mode; everything else is counted as its RGB conversion.
+        if image.mode in ('La', 'RGBa'):
+            image = image.convert(image.mode[:-1] + 'A')
+        if image.mode not in ('1', 'L', 'P', 'RGB', 'RGBA'):
+            image = image.convert('RGB')
+        palette = image.getpalette() if image.mode == 'P' else None
+        self.update_strips(histogram.iter_image_strips(image, strip_height),
+                           palette)
+
+    def update_pcx(self, reader, strip_height=histogram.DEFAULT_STRIP_HEIGHT):
+        self.update_strips(reader.iter_strips(strip_height), reader.palette)
+
+    def get_items(self):
+        if self._dense is not None:
+            keys = numpy.flatnonzero(self._dense).astype(numpy.uint32)
+            return keys, self._dense[keys]
+        return self._keys, self._counts
+
+    def merge(self, other):
+        if other.bits != self.bits:
+            raise ValueError('Cannot merge %d-bit and %d-bit histograms' %
+                             (other.bits, self.bits))
+        keys, counts = other.get_items()
+        self.add_keys(keys, counts)
+        self.image_count += other.image_count
+        return self
+
+    def __iadd__(self, other):
+        return self.merge(other)
+
+    def __len__(self):
+        return len(self.get_items()[0])
+
+    def top_colors(self, k):
+        keys, counts = self.get_items()
+        total = int(counts.sum())
+        if 0 < k < len(counts):
+            top = numpy.argpartition(counts, -k)[-k:]
+        else:
+            top = numpy.arange(len(counts))[:max(k, 0)]
+        top = top[numpy.argsort(-counts[top], kind='stable')]
+
+        colors = unpack_keys(keys[top], self.bits)
+        return [
+            DominantColor(tuple(int(c) for c in color), int(count),
+                          int(count) / total)
+            for color, count in zip(colors, counts[top])
+        ]
+
+    def to_bytes(self):
+        keys, counts = self.get_items()
+        buffer = io.BytesIO()
+        numpy.savez_compressed(buffer, bits=self.bits, keys=keys,
+                               counts=counts, image_count=self.image_count)
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data):
+        with numpy.load(io.BytesIO(data)) as archive:
+            joint = cls(int(archive['bits']))
+            joint.add_keys(archive['keys'], archive['counts'])
+            joint.image_count = int(archive['image_count'])
+        return joint
+
+
+def accumulate_image_file(image_path, bits=DEFAULT_BITS,
+                          strip_height=histogram.DEFAULT_STRIP_HEIGHT):
+    joint = JointHistogram(bits)
+    if pcx.is_pcx(image_path):
+        joint.update_pcx(pcx.PcxReader(image_path), strip_height)
+    else:
+        with PIL.Image.open(image_path) as image:
+            joint.update_image(image, strip_height)
+    return joint
+
+
+def accumulate_file(image_path, bits=DEFAULT_BITS):
+    return accumulate_image_file(image_path, bits).to_bytes()
+
+
+def accumulate_paths(image_paths, bits=DEFAULT_BITS, workers=None,
+                     on_error=None):
+    joint = JointHistogram(bits)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(accumulate_file, image_path, bits): image_path
+            for image_path in image_paths
+        }
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                joint.merge(JointHistogram.from_bytes(future.result()))
+            except Exception as ex:
+                if on_error is not None:
+                    on_error(futures[future], ex)
+    return joint
@@ -0,0 +1,151 @@
+import struct
+
+import numpy
+
+
+HEADER_SIZE = 128
+PALETTE_SIZE = 769
+READ_SIZE = 1 << 16
+# The palette PIL writes for greyscale images, which it reads back as L.
+GREY_PALETTE = bytes(i for i in range(256) for _ in range(3))
+
+
+def is_pcx(path):
+    with open(path, 'rb') as file:
+        header = file.read(4)
+    return len(header) == 4 and header[0] == 0x0A and header[2] in (0, 1)
+
+
+def decode_rle(data):
+    # A byte of 0xC0 or above is a run marker, unless it is the value of the
+    # marker just before it. So in every stretch of such bytes the markers
+    # are the ones at even offsets from the start of the stretch, which lets
+    # a whole chunk be decoded without a Python loop over the bytes.
+    high = data >= 0xC0
+    stretch_start = high & ~numpy.concatenate(([False], high[:-1]))
+    indices = numpy.arange(len(data))
+    starts = numpy.maximum.accumulate(numpy.where(stretch_start, indices, 0))
+    markers = high & ((indices - starts) % 2 == 0)
+
+    # A marker at the very end needs its value from the next chunk.
+    used = len(data) - 1 if len(data) and markers[-1] else len(data)
+    if used == 0:
+        return numpy.empty(0, numpy.uint8), 0
+    data, markers = data[:used], markers[:used]
+
+    values_of_markers = numpy.concatenate(([False], markers[:-1]))
+    next_bytes = numpy.concatenate((data[1:], [0])).astype(numpy.uint8)
+    lengths = numpy.where(markers, data & 0x3F, 1)
+    lengths[values_of_markers] = 0
+    values = numpy.where(markers, next_bytes, data)
+    return numpy.repeat(values, lengths), used
+
+
+class PcxReader:
+    # Decodes a PCX file chunk by chunk and hands out one scanline at a time
+    # in a reusable buffer, so the whole raster is never held in memory.
+    # Scanlines and strips are views into that buffer and are overwritten by
+    # the next one.
+
+    def __init__(self, path):
+        self.path = path
+
+        with open(path, 'rb') as file:
+            header = file.read(HEADER_SIZE)
+            if len(header) < HEADER_SIZE or header[0] != 0x0A:
+                raise ValueError('%s is not a PCX file' % path)
+
+            (self.version, self.encoding, self.bits_per_pixel,
+             x_min, y_min, x_max, y_max) = struct.unpack('<3B4H', header[1:12])
+            self.plane_count, self.bytes_per_line = \
+                struct.unpack('<BH', header[65:68])
+
+            self.width = x_max - x_min + 1
+            self.height = y_max - y_min + 1
+            self.palette = None
+
+            if (self.bits_per_pixel, self.plane_count) == (8, 1):
+                file.seek(-PALETTE_SIZE, 2)
+                palette = file.read(PALETTE_SIZE)
+                if palette[0] == 0x0C and palette[1:] != GREY_PALETTE:
+                    self.palette = list(palette[1:])
+                    self.mode, self.bands = 'P', ('R', 'G', 'B')
+                else:
+                    self.mode, self.bands = 'L', ('L',)
+            elif (self.bits_per_pixel, self.plane_count) == (8, 3):
+                self.mode, self.bands = 'RGB', ('R', 'G', 'B')
+            elif (self.bits_per_pixel, self.plane_count) == (8, 4):
+                self.mode, self.bands = 'RGBA', ('R', 'G', 'B', 'A')
+            elif (self.bits_per_pixel, self.plane_count) == (1, 1):
+                self.mode, self.bands = '1', ('1',)
+            else:
+                raise ValueError('Unsupported PCX layout: %d bits, %d planes' %
+                                 (self.bits_per_pixel, self.plane_count))
+
+        self.line_size = self.plane_count * self.bytes_per_line
+
+    @property
+    def size(self):
+        return self.width, self.height
+
+    def iter_decoded_chunks(self):
+        data = numpy.empty(0, dtype=numpy.uint8)
+        with open(self.path, 'rb') as file:
+            file.seek(HEADER_SIZE)
+            while True:
+                chunk = file.read(READ_SIZE)
+                if not chunk:
+                    break
+                data = numpy.concatenate(
+                    (data, numpy.frombuffer(chunk, dtype=numpy.uint8))
+                )
+                if self.encoding:
+                    decoded, used = decode_rle(data)
+                else:
+                    decoded, used = data, len(data)
+                data = data[used:]
+                yield decoded
+
+    def iter_raw_lines(self):
+        line = numpy.empty(self.line_size, dtype=numpy.uint8)
+        filled = 0
+        line_count = 0
+
+        for decoded in self.iter_decoded_chunks():
+            position = 0
+            while position < len(decoded):
+                used = min(self.line_size - filled, len(decoded) - position)
+                line[filled:filled + used] = decoded[position:position + used]
+                filled += used
+                position += used
+                if filled == self.line_size:
+                    yield line
+                    filled = 0
+                    line_count += 1
+                    if line_count == self.height:
+                        return
+
+        raise ValueError('%s is truncated' % self.path)
+
+    def iter_scanlines(self):
+        for line in self.iter_raw_lines():
+            planes = line.reshape(self.plane_count, self.bytes_per_line)
+            if self.bits_per_pixel == 1:
+                yield numpy.unpackbits(planes[0])[:self.width, numpy.newaxis] * \
+                    numpy.uint8(255)
+            else:
+                yield planes[:, :self.width].T
+
+    def iter_strips(self, strip_height):
+        channels = 1 if self.bits_per_pixel == 1 else self.plane_count
+        strip = numpy.empty((strip_height, self.width, channels),
+                            dtype=numpy.uint8)
+        row = 0
+        for scanline in self.iter_scanlines():
+            strip[row] = scanline
+            row += 1
+            if row == strip_height:
+                yield strip
+                row = 0
+        if row:
+            yield strip[:row]
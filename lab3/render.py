@@ -0,0 +1,114 @@
+import concurrent.futures
+import csv
+import json
+import os
+import sys
+
+import histogram
+import histogram_stats
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'common'))
+import traversal
+
+
+FIGURE_FORMATS = ('png', 'svg')
+DATA_FORMATS = ('json', 'csv')
+FORMATS = FIGURE_FORMATS + DATA_FORMATS
+
+
+def draw_figure(counts, mean, plot_color):
+    # matplotlib is only imported once a plot is actually drawn.
+    from matplotlib.figure import Figure
+
+    figure = Figure(figsize=(8, 5.3333333), dpi=75)
+    plot = figure.add_subplot(111)
+    plot.set_xlim([0, len(counts) - 1])
+    plot.plot(range(0, len(counts)), counts, color=plot_color)
+    plot.axvline(mean, color='purple')
+    return figure
+
+
+def save_figure(figure, path, format):
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    FigureCanvasAgg(figure).print_figure(path, format=format)
+
+
+def write_json(path, image_path, bands, counts):
+    with open(path, 'w') as file:
+        json.dump({
+            'image': image_path,
+            'bands': {
+                band: {
+                    'counts': band_counts.tolist(),
+                    'stats': histogram_stats.describe(band_counts),
+                }
+                for band, band_counts in zip(bands, counts)
+            },
+        }, file)
+
+
+def write_csv(path, bands, counts):
+    with open(path, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(('value',) + tuple(bands))
+        for value, row in enumerate(counts.T.tolist()):
+            writer.writerow([value] + row)
+
+
+def render_file(image_path, output_base, formats):
+    accumulator = histogram.accumulate_image_file(image_path)
+    bands, counts = accumulator.bands, accumulator.counts
+    os.makedirs(os.path.dirname(output_base) or '.', exist_ok=True)
+
+    written = []
+    for format in formats:
+        if format == 'json':
+            written.append(output_base + '.json')
+            write_json(written[-1], image_path, bands, counts)
+        elif format == 'csv':
+            written.append(output_base + '.csv')
+            write_csv(written[-1], bands, counts)
+        else:
+            for band, band_counts in zip(bands, counts):
+                figure = draw_figure(
+                    band_counts, histogram_stats.mean(band_counts),
+                    histogram.BAND_COLORS.get(band, 'k')
+                )
+                written.append('%s_%s.%s' % (
+                    output_base, histogram.BAND_NAMES.get(band, band), format
+                ))
+                save_figure(figure, written[-1], format)
+    return written
+
+
+def get_output_base(image_path, input_path, output_dir):
+    if os.path.isdir(input_path):
+        relative_path = os.path.relpath(image_path, input_path)
+    else:
+        relative_path = os.path.basename(image_path)
+    # The extension is kept, so that x.gif and x.jpg don't overwrite each
+    # other's output.
+    return os.path.join(output_dir, relative_path)
+
+
+def render_paths(input_path, output_dir, formats, workers=None,
+                 on_error=None, traversal_options=None):
+    written = []
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(
+                render_file, image_path,
+                get_output_base(image_path, input_path, output_dir), formats
+            ): image_path
+            for image_path in traversal.iter_files(
+                input_path, **(traversal_options or {})
+            )
+        }
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                written.extend(future.result())
+            except Exception as ex:
+                if on_error is not None:
+                    on_error(futures[future], ex)
+    return written
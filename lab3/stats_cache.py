@@ -0,0 +1,163 @@
+import json
+import os
+import sqlite3
+import sys
+import time
+
+import histogram
+import histogram_stats
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'common'))
+import checksums
+
+
+DEFAULT_CACHE_PATH = os.environ.get(
+    'COLOR_STATS_CACHE',
+    os.path.join(os.path.expanduser('~'), '.cache', 'color_stats.sqlite')
+)
+DEFAULT_MAX_SIZE = 256 * 2 ** 20
+COMMIT_INTERVAL = 64
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS entries (
+    digest TEXT PRIMARY KEY,
+    histogram BLOB NOT NULL,
+    stats TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used);
+CREATE TABLE IF NOT EXISTS files (
+    device INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    digest TEXT NOT NULL,
+    PRIMARY KEY (device, inode)
+);
+'''
+
+
+def get_stats(accumulator):
+    return {
+        band: histogram_stats.describe(counts)
+        for band, counts in zip(accumulator.bands, accumulator.counts)
+    }
+
+
+def get_file_key(path):
+    stat = os.stat(path)
+    return stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+def compute_entry(image_path):
+    # Run in the worker processes: a file missing from the cache is stat'ed
+    # and hashed where it is decoded, so the parent never reads it.
+    file_key = get_file_key(image_path)
+    digest = checksums.get_file_checksum(image_path)
+    return file_key, digest, histogram.accumulate_file(image_path)
+
+
+class StatsCache:
+    # Histograms and statistics keyed by the SHA-256 of the file contents.
+    # The device, inode, size and mtime of a file are remembered alongside,
+    # so unchanged files are found again without being read. Changes are
+    # committed every COMMIT_INTERVAL entries, so an interrupted run keeps
+    # most of its work.
+
+    compute_entry = staticmethod(compute_entry)
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_size=DEFAULT_MAX_SIZE):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(SCHEMA)
+        self.max_size = max_size
+
+        self.hits = 0
+        self.misses = 0
+        self.duplicates = 0
+        self._uncommitted = 0
+
+    def get(self, path):
+        # Only the file metadata is looked up; files that changed, or were
+        # never seen, are hashed by compute_entry together with decoding.
+        device, inode, size, mtime_ns = get_file_key(path)
+        row = self.connection.execute(
+            'SELECT entries.digest, histogram FROM files '
+            'JOIN entries ON entries.digest = files.digest '
+            'WHERE device = ? AND inode = ? AND files.size = ? '
+            'AND mtime_ns = ?', (device, inode, size, mtime_ns)
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.connection.execute(
+            'UPDATE entries SET last_used = ? WHERE digest = ?',
+            (time.time(), row[0])
+        )
+        self.hits += 1
+        return histogram.HistogramAccumulator.from_bytes(row[1])
+
+    def put(self, file_key, digest, accumulator):
+        self.connection.execute(
+            'INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)',
+            file_key + (digest,)
+        )
+        # Another file with the same contents may have been cached already.
+        cursor = self.connection.execute(
+            'UPDATE entries SET last_used = ? WHERE digest = ?',
+            (time.time(), digest)
+        )
+        if cursor.rowcount:
+            self.duplicates += 1
+        else:
+            data = accumulator.to_bytes()
+            self.connection.execute(
+                'INSERT INTO entries VALUES (?, ?, ?, ?, ?)',
+                (digest, data, json.dumps(get_stats(accumulator)), len(data),
+                 time.time())
+            )
+            self.evict()
+
+        self._uncommitted += 1
+        if self._uncommitted >= COMMIT_INTERVAL:
+            self.connection.commit()
+            self._uncommitted = 0
+
+    def put_file(self, path, accumulator):
+        self.put(get_file_key(path), checksums.get_file_checksum(path),
+                 accumulator)
+
+    def evict(self):
+        total_size, = self.connection.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM entries'
+        ).fetchone()
+        if total_size <= self.max_size:
+            return
+
+        # Drop the least recently used entries until the cache fits again.
+        rows = self.connection.execute(
+            'SELECT digest, size FROM entries ORDER BY last_used'
+        ).fetchall()
+        for digest, size in rows:
+            if total_size <= self.max_size:
+                break
+            self.connection.execute('DELETE FROM entries WHERE digest = ?',
+                                    (digest,))
+            total_size -= size
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def format_counters(self):
+        return 'cache: %d hits, %d misses (%d with cached contents)' % (
+            self.hits, self.misses, self.duplicates
+        )
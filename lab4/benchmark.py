@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+import argparse
+import io
+import os
+import sys
+import time
+
+import PIL.ExifTags
+import PIL.Image
+
+import image_stats
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'common'))
+import image_files
+import traversal
+
+
+LAB_DIR = os.path.dirname(os.path.abspath(__file__))
+IMAGES_DIR = os.path.join(LAB_DIR, '..', 'lab3', 'imgs')
+# Files image_stats comes across in real folders besides the images.
+NON_IMAGES = [os.path.join(LAB_DIR, name)
+              for name in ('image_stats.py', 'records.py', 'requirements.txt')]
+
+
+def get_metadata_before(image):
+    # get_image_metadata as it was before sniffing. Every image is asked
+    # for its EXIF data, which for a PNG decodes the whole image.
+    metadata = image.info.copy()
+
+    metadata['size'] = image.size
+    metadata['format'] = image.format.lower()
+    metadata['color_mode'] = image.mode
+
+    try:
+        metadata.update({
+            PIL.ExifTags.TAGS[k]: v
+            for k, v in image._getexif().items()
+            if k in PIL.ExifTags.TAGS
+        })
+    except AttributeError:
+        pass
+
+    if 'XResolution' in metadata and 'YResolution' in metadata and 'dpi' not in metadata:
+        metadata['dpi'] = (metadata['XResolution'][0], metadata['YResolution'][0])
+
+    for name in ['exif', 'icc_profile', 'MakerNote', 'UserComment']:
+        if name in metadata:
+            del metadata[name]
+
+    return metadata
+
+
+def open_with_pil(image_path):
+    # What image_stats did before sniffing: every file goes to PIL.
+    with image_stats.CountingFile(image_path) as raw_file:
+        try:
+            with PIL.Image.open(io.BufferedReader(raw_file)) as image:
+                get_metadata_before(image)
+        except Exception:
+            pass
+        return raw_file.bytes_read
+
+
+def open_with_sniffing(image_path):
+    try:
+        return image_stats.read_metadata(image_path)[1]
+    except image_stats.UnknownFormatError:
+        return image_files.SNIFF_SIZE
+
+
+def measure(function, image_paths, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        bytes_read = [function(image_path) for image_path in image_paths]
+    return (time.perf_counter() - start) / repeat, bytes_read
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('images_path', type=str, nargs='?',
+                        help='Path to an image or a folder with images '
+                             '(default: the lab3 images and a few '
+                             'non-images)')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    if args.images_path is None:
+        image_paths = list(traversal.iter_files(IMAGES_DIR)) + NON_IMAGES
+    else:
+        image_paths = list(traversal.iter_files(args.images_path))
+    sizes = [os.path.getsize(image_path) for image_path in image_paths]
+    pil_time, pil_bytes = measure(open_with_pil, image_paths, args.repeat)
+    sniff_time, sniff_bytes = measure(open_with_sniffing, image_paths,
+                                      args.repeat)
+
+    print('%-32s %12s %12s %12s %8s' % ('file', 'size', 'PIL only',
+                                        'sniffing', 'share'))
+    for image_path, size, pil_read, sniff_read in zip(image_paths, sizes,
+                                                      pil_bytes, sniff_bytes):
+        print('%-32s %12d %12d %12d %7.2f%%' % (
+            os.path.basename(image_path)[:32], size, pil_read, sniff_read,
+            sniff_read / size * 100 if size else 0
+        ))
+    print()
+
+    for name, elapsed, bytes_read in (('PIL only', pil_time, pil_bytes),
+                                      ('sniffing', sniff_time, sniff_bytes)):
+        print('%-10s %8.1f ms for %d files, %10.1f bytes read per file '
+              '(%.2f%% of %d bytes)' % (
+                  name, elapsed * 1000, len(image_paths),
+                  sum(bytes_read) / len(image_paths),
+                  sum(bytes_read) / sum(sizes) * 100, sum(sizes)
+              ))
+
+
+if __name__ == '__main__':
+    main()
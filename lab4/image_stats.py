@@ -1,18 +1,47 @@
 #!/usr/bin/env python
 import os
 import argparse
+import collections
+import concurrent.futures
+import io
+import sys
+import time
 
 import PIL.Image
 import PIL.ExifTags
 
+import records
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'common'))
+import image_files
+import traversal
 
-def get_image_paths(path):
-    if os.path.isdir(path):
-        for dirpath, dirnames, filenames in os.walk(path):
-            for filename in filenames:
-                yield os.path.join(dirpath, filename)
-    else:
-        yield path
+
+class UnknownFormatError(ValueError):
+    pass
+
+
+class CountingFile(io.FileIO):
+    # Counts the bytes actually read from disk, below any buffering.
+
+    def __init__(self, path):
+        super().__init__(path, 'rb')
+        self.bytes_read = 0
+
+    def readinto(self, buffer):
+        count = super().readinto(buffer)
+        self.bytes_read += count or 0
+        return count
+
+    def read(self, size=-1):
+        data = super().read(size)
+        self.bytes_read += len(data or b'')
+        return data
+
+    def readall(self):
+        data = super().readall()
+        self.bytes_read += len(data)
+        return data
 
 
 def get_image_metadata(image):
@@ -22,14 +51,18 @@ def get_image_metadata(image):
     metadata['format'] = image.format.lower()
     metadata['color_mode'] = image.mode
 
-    try:
-        metadata.update({
-            PIL.ExifTags.TAGS[k]: v
-            for k, v in image._getexif().items()
-            if k in PIL.ExifTags.TAGS
-        })
-    except AttributeError:
-        pass
+    # Pillow looks for a PNG eXIf chunk past the image data by decoding the
+    # whole image, so it is only asked when the chunk was already seen.
+    skip_exif = image.format == 'PNG' and 'exif' not in image.info
+    if not skip_exif:
+        try:
+            metadata.update({
+                PIL.ExifTags.TAGS[k]: v
+                for k, v in image._getexif().items()
+                if k in PIL.ExifTags.TAGS
+            })
+        except AttributeError:
+            pass
 
     if 'XResolution' in metadata and 'YResolution' in metadata and 'dpi' not in metadata:
         metadata['dpi'] = (metadata['XResolution'][0], metadata['YResolution'][0])
@@ -41,22 +74,153 @@ def get_image_metadata(image):
     return metadata
 
 
+def read_metadata(image_path):
+    # The first bytes decide whether PIL gets to see the file at all. After
+    # that only the headers PIL parses on open are read; pixel data is never
+    # loaded.
+    with CountingFile(image_path) as raw_file:
+        header = raw_file.read(image_files.SNIFF_SIZE)
+        if image_files.sniff_format(header) is None:
+            raise UnknownFormatError('%s: not a known image format' %
+                                     image_path)
+
+        raw_file.seek(0)
+        with PIL.Image.open(io.BufferedReader(raw_file)) as image:
+            return get_image_metadata(image), raw_file.bytes_read
+
+
+def extract_metadata(image_path):
+    start = time.perf_counter()
+    try:
+        metadata, error = read_metadata(image_path)[0], None
+    except Exception as ex:
+        metadata, error = None, ex
+    return image_path, metadata, error, time.perf_counter() - start
+
+
+def iter_metadata(image_paths, workers=8, max_in_flight=None, ordered=True):
+    # Only max_in_flight files are submitted at a time, so huge trees don't
+    # pile up futures (or their metadata) faster than they are printed.
+    if max_in_flight is None:
+        max_in_flight = workers * 4
+    image_paths = iter(image_paths)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = collections.deque()
+        for image_path in image_paths:
+            pending.append(executor.submit(extract_metadata, image_path))
+            if len(pending) < max_in_flight:
+                continue
+
+            if ordered:
+                yield pending.popleft().result()
+            else:
+                done, not_done = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                pending = collections.deque(not_done)
+                for future in done:
+                    yield future.result()
+
+        if ordered:
+            for future in pending:
+                yield future.result()
+        else:
+            for future in concurrent.futures.as_completed(pending):
+                yield future.result()
+
+
+def get_percentile(sorted_values, percent):
+    position = (len(sorted_values) - 1) * percent / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + \
+        (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def print_summary(latencies, elapsed, skipped=0, file=sys.stderr):
+    print('%d files in %.2f s, %.1f files/s, %d skipped as non-images' % (
+        len(latencies), elapsed, len(latencies) / elapsed if elapsed else 0,
+        skipped
+    ), file=file)
+    if latencies:
+        latencies = sorted(latencies)
+        print('latency: p50 %.1f ms, p90 %.1f ms, p99 %.1f ms, max %.1f ms' % (
+            get_percentile(latencies, 50) * 1000,
+            get_percentile(latencies, 90) * 1000,
+            get_percentile(latencies, 99) * 1000,
+            latencies[-1] * 1000
+        ), file=file)
+
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('images_path', type=str, help='Path to an image or a folder with images')
+    parser.add_argument('--workers', type=int, default=8,
+                        help='Number of files opened concurrently')
+    parser.add_argument('--max-in-flight', type=int, default=None,
+                        help='Files queued ahead of the output '
+                             '(default: 4 per worker)')
+    parser.add_argument('--unordered', action='store_true',
+                        help='Print files as they finish, not in traversal '
+                             'order')
+    traversal.add_arguments(parser)
+    parser.add_argument('--format', choices=('text',) + tuple(records.WRITERS),
+                        default='text',
+                        help='text: key: value lines; jsonl: one JSON record '
+                             'per image; csv; columnar: JSON batches of '
+                             'columns')
+    parser.add_argument('--output', type=str, default=None,
+                        help='Write the records here instead of stdout')
+    parser.add_argument('--batch-size', type=int,
+                        default=records.DEFAULT_BATCH_SIZE,
+                        help='Records per batch of --format columnar')
     args = parser.parse_args()
 
-    image_paths = get_image_paths(args.images_path)
-    for image_path in image_paths:
-        try:
-            image = PIL.Image.open(image_path)
-            print(image_path)
-            for key, value in sorted(get_image_metadata(image).items()):
-                print('%s: %s' % (key, value))
-            print()
-            image.close()
-        except Exception as ex:
-            print(ex)
+    if args.workers < 1:
+        parser.error('--workers must be at least 1')
+    if args.max_in_flight is not None and args.max_in_flight < 1:
+        parser.error('--max-in-flight must be at least 1')
+    if args.batch_size < 1:
+        parser.error('--batch-size must be at least 1')
+
+    output = records.open_output(args.output)
+    writer = None
+    if args.format == 'columnar':
+        writer = records.ColumnarWriter(output, args.batch_size)
+    elif args.format != 'text':
+        writer = records.WRITERS[args.format](output)
+
+    latencies = []
+    skipped = 0
+    start = time.perf_counter()
+    image_paths = traversal.iter_files(args.images_path,
+                                       **traversal.get_options(args))
+    for image_path, metadata, error, latency in iter_metadata(
+            image_paths, args.workers, args.max_in_flight,
+            ordered=not args.unordered):
+        latencies.append(latency)
+        if isinstance(error, UnknownFormatError):
+            skipped += 1
+            continue
+        if error is not None:
+            print(error, file=sys.stderr if writer else output)
+            continue
+
+        if writer is not None:
+            writer.write(records.get_record(image_path, metadata))
+            continue
+        print(image_path, file=output)
+        for key, value in sorted(metadata.items()):
+            print('%s: %s' % (key, value), file=output)
+        print(file=output)
+
+    if writer is not None:
+        writer.close()
+    if output is not sys.stdout:
+        output.close()
+
+    print_summary(latencies, time.perf_counter() - start, skipped)
 
 
 if __name__ == '__main__':
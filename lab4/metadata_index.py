@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+import argparse
+import json
+import os
+import sqlite3
+import sys
+
+import image_stats
+import records
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'common'))
+import traversal
+
+
+DEFAULT_INDEX_PATH = os.environ.get(
+    'IMAGE_STATS_INDEX',
+    os.path.join(os.path.expanduser('~'), '.cache', 'image_stats.sqlite')
+)
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS images (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    format TEXT,
+    width INTEGER,
+    height INTEGER,
+    megapixels REAL,
+    camera_make TEXT,
+    camera_model TEXT,
+    metadata TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS images_megapixels ON images (megapixels);
+CREATE INDEX IF NOT EXISTS images_camera ON images (camera_make, camera_model);
+'''
+
+
+def get_columns(metadata):
+    width, height = metadata['size']
+    return (
+        metadata['format'], width, height, width * height / 1e6,
+        metadata.get('Make'), metadata.get('Model'),
+        json.dumps(records.normalize_value(metadata), sort_keys=True),
+    )
+
+
+def is_inside(path, root):
+    return path == root or path.startswith(root.rstrip(os.sep) + os.sep)
+
+
+class MetadataIndex:
+    # Metadata of every file seen, keyed by its absolute path. The size and
+    # mtime of a file are stored with it, and only files where they differ
+    # are opened again. Files PIL can't open are kept with their error, so
+    # they aren't retried on every run either.
+
+    def __init__(self, path=DEFAULT_INDEX_PATH):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(SCHEMA)
+
+        self.added = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.removed = 0
+
+    def update(self, images_path, workers=8, on_error=None):
+        root = os.path.abspath(images_path)
+        known = {
+            path: (size, mtime_ns)
+            for path, size, mtime_ns in self.connection.execute(
+                'SELECT path, size, mtime_ns FROM images'
+            )
+            if is_inside(path, root)
+        }
+
+        changed = {}
+        for image_path in traversal.iter_files(root):
+            try:
+                stat = os.stat(image_path)
+            except OSError as ex:
+                if on_error is not None:
+                    on_error(image_path, ex)
+                continue
+
+            signature = (stat.st_size, stat.st_mtime_ns)
+            if known.pop(image_path, None) == signature:
+                self.unchanged += 1
+            else:
+                changed[image_path] = signature
+
+        for image_path, metadata, error, latency in image_stats.iter_metadata(
+                changed, workers):
+            columns = (None,) * 7 if error is not None else get_columns(metadata)
+            cursor = self.connection.execute(
+                'UPDATE images SET size = ?, mtime_ns = ?, format = ?, '
+                'width = ?, height = ?, megapixels = ?, camera_make = ?, '
+                'camera_model = ?, metadata = ?, error = ? WHERE path = ?',
+                changed[image_path] + columns +
+                (error and str(error), image_path)
+            )
+            if cursor.rowcount:
+                self.updated += 1
+            else:
+                self.connection.execute(
+                    'INSERT INTO images VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    (image_path,) + changed[image_path] + columns +
+                    (error and str(error),)
+                )
+                self.added += 1
+
+        # Whatever is left under the root wasn't found on disk any more.
+        self.connection.executemany('DELETE FROM images WHERE path = ?',
+                                    ((path,) for path in known))
+        self.removed += len(known)
+        self.connection.commit()
+
+    def find_by_megapixels(self, min_megapixels):
+        return self.connection.execute(
+            'SELECT path, width, height, megapixels FROM images '
+            'WHERE megapixels >= ? ORDER BY megapixels DESC, path',
+            (min_megapixels,)
+        ).fetchall()
+
+    def count_by_camera(self):
+        return self.connection.execute(
+            'SELECT camera_make, camera_model, COUNT(*), SUM(megapixels) '
+            'FROM images WHERE error IS NULL '
+            'GROUP BY camera_make, camera_model ORDER BY COUNT(*) DESC'
+        ).fetchall()
+
+    def get_metadata(self, path):
+        row = self.connection.execute(
+            'SELECT metadata FROM images WHERE path = ?',
+            (os.path.abspath(path),)
+        ).fetchone()
+        return row and row[0] and json.loads(row[0])
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def format_counters(self):
+        return 'index: %d added, %d updated, %d unchanged, %d removed' % (
+            self.added, self.updated, self.unchanged, self.removed
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Keep an SQLite index of image metadata and query it'
+    )
+    parser.add_argument('--index', type=str, default=DEFAULT_INDEX_PATH,
+                        help='SQLite file holding the index')
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    update_parser = commands.add_parser(
+        'update', help='Index new and changed files, forget removed ones'
+    )
+    update_parser.add_argument('images_path', type=str,
+                               help='Path to an image or a folder with images')
+    update_parser.add_argument('--workers', type=int, default=8,
+                               help='Number of files opened concurrently')
+
+    megapixels_parser = commands.add_parser(
+        'megapixels', help='List images of at least the given size'
+    )
+    megapixels_parser.add_argument('min_megapixels', type=float)
+
+    commands.add_parser('cameras', help='Count images per camera model')
+    args = parser.parse_args()
+
+    def print_error(image_path, ex):
+        print('%s: %s' % (image_path, ex), file=sys.stderr)
+
+    with MetadataIndex(args.index) as index:
+        if args.command == 'update':
+            index.update(args.images_path, args.workers, on_error=print_error)
+            print(index.format_counters())
+        elif args.command == 'megapixels':
+            for path, width, height, megapixels in \
+                    index.find_by_megapixels(args.min_megapixels):
+                print('%8.2f MP %6dx%-6d %s' % (megapixels, width, height,
+                                                path))
+        else:
+            for make, model, count, megapixels in index.count_by_camera():
+                print('%-24s %-32s %6d images %10.1f MP' % (
+                    make or '-', model or '-', count, megapixels
+                ))
+
+
+if __name__ == '__main__':
+    main()
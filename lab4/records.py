@@ -0,0 +1,187 @@
+import collections
+import csv
+import json
+import math
+import numbers
+import sys
+
+
+OUTPUT_BUFFER_SIZE = 1 << 20
+DEFAULT_BATCH_SIZE = 10000
+
+# Every record has exactly these fields, in this order, with these types;
+# whatever else the image carries goes into 'extra'.
+FIELDS = collections.OrderedDict([
+    ('path', str),
+    ('format', str),
+    ('width', int),
+    ('height', int),
+    ('color_mode', str),
+    ('dpi_x', float),
+    ('dpi_y', float),
+    ('make', str),
+    ('model', str),
+    ('datetime', str),
+    ('orientation', int),
+    ('exposure_time', float),
+    ('f_number', float),
+    ('iso', int),
+    ('focal_length', float),
+    ('extra', dict),
+])
+EXIF_FIELDS = (
+    ('make', 'Make'),
+    ('model', 'Model'),
+    ('orientation', 'Orientation'),
+    ('exposure_time', 'ExposureTime'),
+    ('f_number', 'FNumber'),
+    ('iso', 'ISOSpeedRatings'),
+    ('focal_length', 'FocalLength'),
+)
+
+
+def normalize_bytes(data):
+    try:
+        text = data.decode('utf-8').rstrip('\x00')
+    except UnicodeDecodeError:
+        return data.hex()
+    if all(char.isprintable() or char.isspace() for char in text):
+        return text
+    return data.hex()
+
+
+def normalize_value(value):
+    if value is None or isinstance(value, (bool, str)):
+        return value
+    if isinstance(value, numbers.Integral):
+        return int(value)
+    if isinstance(value, numbers.Real):
+        # IFDRational included; 0/0 rationals come out as NaN, which JSON
+        # can't represent.
+        try:
+            value = float(value)
+        except ZeroDivisionError:
+            return None
+        return value if math.isfinite(value) else None
+    if isinstance(value, (bytes, bytearray)):
+        return normalize_bytes(bytes(value))
+    if isinstance(value, dict):
+        return {str(key): normalize_value(item) for key, item in value.items()}
+    if isinstance(value, (tuple, list)):
+        return [normalize_value(item) for item in value]
+    return str(value)
+
+
+def convert_field(value, field_type):
+    value = normalize_value(value)
+    if isinstance(value, list):
+        value = value[0] if value else None
+    if value is None:
+        return None
+    try:
+        return field_type(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def get_record(image_path, metadata):
+    extra = dict(metadata)
+    record = collections.OrderedDict((name, None) for name in FIELDS)
+    record['path'] = image_path
+    record['format'] = extra.pop('format')
+    record['width'], record['height'] = extra.pop('size')
+    record['color_mode'] = extra.pop('color_mode')
+
+    dpi = extra.pop('dpi', None)
+    if isinstance(dpi, (tuple, list)) and len(dpi) == 2:
+        record['dpi_x'], record['dpi_y'] = (convert_field(value, float)
+                                            for value in dpi)
+
+    # Only the tag the datetime comes from leaves extra; a DateTime next to
+    # DateTimeOriginal is when the file was last changed, and stays there.
+    datetime_tag = 'DateTimeOriginal' if 'DateTimeOriginal' in extra \
+        else 'DateTime'
+    record['datetime'] = convert_field(extra.pop(datetime_tag, None), str)
+    for name, tag in EXIF_FIELDS:
+        record[name] = convert_field(extra.pop(tag, None), FIELDS[name])
+
+    record['extra'] = normalize_value(extra)
+    return record
+
+
+class JsonLinesWriter:
+    def __init__(self, file):
+        self.file = file
+
+    def write(self, record):
+        self.file.write(json.dumps(record))
+        self.file.write('\n')
+
+    def close(self):
+        self.file.flush()
+
+
+class CsvWriter:
+    def __init__(self, file):
+        self.writer = csv.writer(file)
+        self.writer.writerow(FIELDS)
+        self.file = file
+
+    def write(self, record):
+        self.writer.writerow([
+            json.dumps(value, sort_keys=True) if name == 'extra' else value
+            for name, value in record.items()
+        ])
+
+    def close(self):
+        self.file.flush()
+
+
+class ColumnarWriter:
+    # One JSON object per batch of records, holding a list of values per
+    # field, so a loader can build its columns without going record by
+    # record.
+
+    def __init__(self, file, batch_size=DEFAULT_BATCH_SIZE):
+        self.file = file
+        self.batch_size = batch_size
+        self.columns = collections.OrderedDict((name, []) for name in FIELDS)
+        self.count = 0
+
+    def write(self, record):
+        for name, value in record.items():
+            self.columns[name].append(value)
+        self.count += 1
+        if self.count == self.batch_size:
+            self.flush_batch()
+
+    def flush_batch(self):
+        if not self.count:
+            return
+        json.dump({
+            'count': self.count,
+            'schema': {name: field_type.__name__
+                       for name, field_type in FIELDS.items()},
+            'columns': self.columns,
+        }, self.file)
+        self.file.write('\n')
+        for values in self.columns.values():
+            del values[:]
+        self.count = 0
+
+    def close(self):
+        self.flush_batch()
+        self.file.flush()
+
+
+WRITERS = collections.OrderedDict([
+    ('jsonl', JsonLinesWriter),
+    ('csv', CsvWriter),
+    ('columnar', ColumnarWriter),
+])
+
+
+def open_output(path):
+    if path is None or path == '-':
+        return sys.stdout
+    return open(path, 'w', newline='', buffering=OUTPUT_BUFFER_SIZE)
@@ -0,0 +1,211 @@
+#!/usr/bin/env python
+import argparse
+import collections
+import sys
+import time
+import tracemalloc
+
+import numpy
+
+import framebuffer
+import rasterization
+
+
+WIDTH = 1024
+HEIGHT = 1024
+GAPS_EXPECTED = ('step',)
+
+Result = collections.namedtuple('Result', ['name', 'items', 'pixels', 'time',
+                                           'peak_memory', 'check'])
+
+
+def get_random_segments(count, max_length, random):
+    # Endpoints in every direction from the start, so all eight octants
+    # come up, with lengths spread from 0 to max_length.
+    starts = random.randint(0, [WIDTH, HEIGHT], size=(count, 2))
+    lengths = random.randint(0, max_length + 1, size=count)
+    angles = random.uniform(0, 2 * numpy.pi, size=count)
+    offsets = numpy.stack((lengths * numpy.cos(angles),
+                           lengths * numpy.sin(angles)), axis=1)
+    return numpy.hstack((starts, starts + numpy.rint(offsets).astype(int)))
+
+
+def get_random_circles(count, max_radius, random):
+    centers = random.randint(0, [WIDTH, HEIGHT], size=(count, 2))
+    radii = random.randint(0, max_radius + 1, size=(count, 1))
+    return numpy.hstack((centers, radii))
+
+
+def measure(function, trace_memory=True):
+    # The framebuffers are made outside of the measurement, so only the
+    # memory the algorithm itself allocates is counted.
+    target = framebuffer.Framebuffer(WIDTH, HEIGHT)
+    start = time.perf_counter()
+    function(target)
+    elapsed = time.perf_counter() - start
+    if not trace_memory:
+        return elapsed, None
+
+    # A second run under tracemalloc, which slows everything down.
+    target = framebuffer.Framebuffer(WIDTH, HEIGHT)
+    tracemalloc.start()
+    function(target)
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak_memory
+
+
+def is_connected(points):
+    return all(abs(x1 - x2) <= 1 and abs(y1 - y2) <= 1
+               for (x1, y1), (x2, y2) in zip(points, points[1:]))
+
+
+def check_line(name, segments):
+    # Every line has to contain both endpoints and go from one pixel to an
+    # adjacent one; the pixels are compared against Bresenham.
+    iter_line = rasterization.LINE_ALGORITHMS[name]
+    broken = same = 0
+    for x1, y1, x2, y2 in segments:
+        points = list(iter_line(x1, y1, x2, y2))
+        if (x1, y1) not in points or (x2, y2) not in points or \
+                not is_connected(points):
+            broken += 1
+        same += set(points) == set(rasterization.iter_bresenham(x1, y1,
+                                                                x2, y2))
+    message = '%d broken, %.1f%% as Bresenham' % (
+        broken, same / len(segments) * 100
+    )
+    # The step algorithm only steps along x, so steep lines have gaps.
+    if name in GAPS_EXPECTED:
+        return message + ' (gaps expected)', True
+    return message, broken == 0
+
+
+def check_batch(segments):
+    loop_target = framebuffer.Framebuffer(WIDTH, HEIGHT)
+    rasterization.draw_lines(loop_target, segments)
+    batch_target = framebuffer.Framebuffer(WIDTH, HEIGHT)
+    rasterization.draw_lines_batch(batch_target, numpy.array(segments))
+    same = loop_target.pixels == batch_target.pixels
+    return 'same pixels as the loop' if same else 'DIFFERENT pixels', same
+
+
+def check_circles(circles, filled):
+    different = 0
+    for center_x, center_y, radius in circles:
+        points = set(rasterization.iter_circle(center_x, center_y, radius))
+        if filled:
+            rows = collections.defaultdict(list)
+            for x, y in points:
+                rows[y].append(x)
+            points = {(x, y) for y, xs in rows.items()
+                      for x in range(min(xs), max(xs) + 1)}
+        spans = rasterization.iter_circle_spans(center_x, center_y, radius,
+                                                filled)
+        different += points != {(x, y) for y, x_from, x_to in spans
+                                for x in range(x_from, x_to + 1)}
+    return '%d differ from the points' % different, different == 0
+
+
+def count_line_pixels(iter_line, segments):
+    return sum(sum(1 for _ in iter_line(*segment)) for segment in segments)
+
+
+def count_span_pixels(circles, filled):
+    return sum(
+        x_to - x_from + 1
+        for circle in circles
+        for y, x_from, x_to in rasterization.iter_circle_spans(*circle,
+                                                               filled=filled)
+    )
+
+
+def run_suite(segment_count, max_length, circle_count, max_radius,
+              check_count, random, trace_memory=True):
+    segments = get_random_segments(segment_count, max_length, random)
+    segment_list = segments.tolist()
+    circles = get_random_circles(circle_count, max_radius, random).tolist()
+    check_segments = segment_list[:check_count]
+    check_circles_ = circles[:check_count]
+
+    def draw_lines(algorithm):
+        return lambda target: rasterization.draw_lines(target, segment_list,
+                                                       algorithm)
+
+    results = []
+    for name, iter_line in rasterization.LINE_ALGORITHMS.items():
+        results.append((name, len(segments),
+                        count_line_pixels(iter_line, segment_list),
+                        draw_lines(name), check_line(name, check_segments)))
+    results.append((
+        'bresenham batch', len(segments),
+        count_line_pixels(rasterization.iter_bresenham, segment_list),
+        lambda target: rasterization.draw_lines_batch(target, segments),
+        check_batch(check_segments)
+    ))
+    results.append((
+        'circle points', len(circles),
+        sum(sum(1 for _ in rasterization.iter_circle(*circle))
+            for circle in circles),
+        lambda target: target.draw_points(
+            point for circle in circles
+            for point in rasterization.iter_circle(*circle)
+        ),
+        ('reference', True)
+    ))
+    for filled in (False, True):
+        results.append((
+            'disc spans' if filled else 'circle spans', len(circles),
+            count_span_pixels(circles, filled),
+            lambda target, filled=filled: rasterization.draw_circles(
+                target, circles, filled=filled
+            ),
+            check_circles(check_circles_, filled)
+        ))
+
+    for name, items, pixels, function, check in results:
+        elapsed, peak_memory = measure(function, trace_memory)
+        yield Result(name, items, pixels, elapsed, peak_memory, check)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Time the lab5 rasterizers on random workloads and check '
+                    'their pixels'
+    )
+    parser.add_argument('--segments', type=int, default=5000)
+    parser.add_argument('--max-length', type=int, default=200)
+    parser.add_argument('--circles', type=int, default=200)
+    parser.add_argument('--max-radius', type=int, default=200)
+    parser.add_argument('--no-memory', action='store_true',
+                        help='Skip the second, much slower run under '
+                             'tracemalloc')
+    parser.add_argument('--check', type=int, default=1000,
+                        help='Number of segments and circles whose pixels '
+                             'are compared')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    random = numpy.random.RandomState(args.seed)
+    print('%-16s %8s %10s %9s %10s %12s %10s  %s' % (
+        'algorithm', 'items', 'pixels', 'time, s', 'Mpx/s', 'items/s',
+        'peak, KB', 'check'
+    ))
+    failed = False
+    for result in run_suite(args.segments, args.max_length, args.circles,
+                            args.max_radius, args.check, random,
+                            not args.no_memory):
+        message, passed = result.check
+        print('%-16s %8d %10d %9.3f %10.2f %12.0f %10s  %s%s' % (
+            result.name, result.items, result.pixels, result.time,
+            result.pixels / result.time / 1e6, result.items / result.time,
+            '-' if result.peak_memory is None
+            else '%.0f' % (result.peak_memory / 1024),
+            message, '' if passed else ' FAIL'
+        ))
+        failed = failed or not passed
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
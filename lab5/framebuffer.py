@@ -0,0 +1,59 @@
+BLACK = (0, 0, 0)
+WHITE = (255, 255, 255)
+
+
+class Framebuffer:
+    # RGB pixels in one bytearray, three bytes per pixel, row by row. Drawing
+    # only touches the buffer; it is handed to Tk as a single PPM image.
+
+    def __init__(self, width, height, color=WHITE):
+        self.width = width
+        self.height = height
+        self.pixels = bytearray(width * height * 3)
+        self.fill(color)
+
+    def fill(self, color):
+        self.pixels[:] = bytes(color) * (self.width * self.height)
+
+    def draw_spans(self, spans, color=BLACK):
+        # Spans are copied out of one full row of the color, without
+        # building a new bytes object per span.
+        width, height, pixels = self.width, self.height, self.pixels
+        row = memoryview(bytes(color) * width)
+        for y, x_from, x_to in spans:
+            if not 0 <= y < height:
+                continue
+            if x_from < 0:
+                x_from = 0
+            if x_to >= width:
+                x_to = width - 1
+            if x_from <= x_to:
+                offset = (y * width + x_from) * 3
+                size = (x_to - x_from + 1) * 3
+                pixels[offset:offset + size] = row[:size]
+
+    def draw_points(self, points, color=BLACK):
+        color = bytes(color)
+        width, height, pixels = self.width, self.height, self.pixels
+        for x, y in points:
+            if 0 <= x < width and 0 <= y < height:
+                offset = (y * width + x) * 3
+                pixels[offset:offset + 3] = color
+
+    def get_region(self, x, y, width, height):
+        width = min(width, self.width - x)
+        height = min(height, self.height - y)
+        rows = (
+            self.pixels[((row_y * self.width) + x) * 3:
+                        ((row_y * self.width) + x + width) * 3]
+            for row_y in range(y, y + height)
+        )
+        return width, height, b''.join(rows)
+
+    def to_ppm(self, x=0, y=0, width=None, height=None):
+        if width is None:
+            width = self.width - x
+        if height is None:
+            height = self.height - y
+        width, height, data = self.get_region(x, y, width, height)
+        return b'P6 %d %d 255\n' % (width, height) + data
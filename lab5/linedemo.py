@@ -1,8 +1,11 @@
 #!/usr/bin/env python
-import math
 import tkinter as tk
 import tkinter.messagebox
 
+import framebuffer
+import rasterization
+import zoom_view
+
 
 CANVAS_WIDTH = 600
 CANVAS_HEIGHT = 300
@@ -10,10 +13,6 @@ CANVAS_PADDING = 3
 CANVAS_BORDER_SIZE = 1
 
 ZOOM_CELL_SIZE = 10
-ZOOM_CELL_WIDTH = (CANVAS_WIDTH - CANVAS_PADDING - CANVAS_BORDER_SIZE) // \
-                  (ZOOM_CELL_SIZE + CANVAS_BORDER_SIZE)
-ZOOM_CELL_HEIGHT = (CANVAS_HEIGHT - CANVAS_PADDING - CANVAS_BORDER_SIZE) // \
-                   (ZOOM_CELL_SIZE + CANVAS_BORDER_SIZE)
 
 
 class LineDemoWindow:
@@ -22,10 +21,10 @@ class LineDemoWindow:
 
         self.main_canvas = tk.Canvas(self.root,
                                      width=CANVAS_WIDTH, height=CANVAS_HEIGHT)
-        self.main_canvas.grid(row=0, column=0, rowspan=7)
+        self.main_canvas.grid(row=0, column=0, rowspan=10)
         self.zoom_canvas = tk.Canvas(self.root,
                                      width=CANVAS_WIDTH, height=CANVAS_HEIGHT)
-        self.zoom_canvas.grid(row=7, column=0)
+        self.zoom_canvas.grid(row=10, column=0)
 
         self.from_label = tk.Label(self.root, text='From')
         self.from_label.grid(row=0, column=1)
@@ -66,8 +65,60 @@ class LineDemoWindow:
         )
         self.bresenham_circle_button.grid(row=5, column=1, sticky='w',
                                           columnspan=3)
-        self.root.grid_rowconfigure(6, weight=1)
+        self.disc_button = tk.Button(
+            self.root, text='Круг (заливка)',
+            command=self.draw_disc
+        )
+        self.disc_button.grid(row=6, column=1, sticky='w', columnspan=3)
+        self.ellipse_button = tk.Button(
+            self.root, text='Эллипс',
+            command=self.draw_ellipse
+        )
+        self.ellipse_button.grid(row=7, column=1, sticky='w', columnspan=3)
+        self.filled_ellipse_button = tk.Button(
+            self.root, text='Эллипс (заливка)',
+            command=lambda: self.draw_ellipse(filled=True)
+        )
+        self.filled_ellipse_button.grid(row=8, column=1, sticky='w',
+                                        columnspan=3)
+        self.root.grid_rowconfigure(9, weight=1)
+
+        self.framebuffer = framebuffer.Framebuffer(
+            CANVAS_WIDTH - CANVAS_PADDING - CANVAS_BORDER_SIZE,
+            CANVAS_HEIGHT - CANVAS_PADDING - CANVAS_BORDER_SIZE
+        )
+        self._present_scheduled = False
+
+        # The canvas items are made once; drawing only changes the pixels
+        # of their images.
+        self.main_image_item = self.main_canvas.create_image(
+            CANVAS_PADDING + CANVAS_BORDER_SIZE,
+            CANVAS_PADDING + CANVAS_BORDER_SIZE, anchor='nw'
+        )
+        self.main_canvas.create_rectangle(
+            CANVAS_PADDING, CANVAS_PADDING,
+            CANVAS_WIDTH, CANVAS_HEIGHT,
+            outline='grey'
+        )
+        self.zoom_region_item = self.main_canvas.create_rectangle(
+            0, 0, 0, 0, outline='#AAAAAA'
+        )
+        self.zoom_view = zoom_view.ZoomView(
+            self.zoom_canvas, self.framebuffer,
+            CANVAS_WIDTH, CANVAS_HEIGHT, ZOOM_CELL_SIZE, CANVAS_PADDING
+        )
 
+        # Clicking the main canvas moves the zoomed region there; it can
+        # also be dragged around and zoomed with the mouse wheel.
+        self.main_canvas.bind('<Button-1>', self.on_main_click)
+        self.zoom_canvas.bind('<ButtonPress-1>', self.on_zoom_press)
+        self.zoom_canvas.bind('<B1-Motion>', self.on_zoom_drag)
+        self.zoom_canvas.bind('<MouseWheel>', self.on_zoom_wheel)
+        self.zoom_canvas.bind('<Button-4>', self.on_zoom_wheel)
+        self.zoom_canvas.bind('<Button-5>', self.on_zoom_wheel)
+        self._drag_pixel = None
+
+        self.update_zoom_region()
         self.clear()
 
     def get_points(self):
@@ -78,27 +129,15 @@ class LineDemoWindow:
         return (from_x, from_y), (to_x, to_y)
 
     def draw_step(self):
-        try:
-            (x1, y1), (x2, y2) = self.get_points()
-        except ValueError:
-            tkinter.messagebox.showerror('Error', 'Invalid coordinates')
-            return
+        self.draw_line(rasterization.iter_step)
 
-        self.clear()
-
-        if x1 > x2:
-            x1, x2 = x2, x1
-            y1, y2 = y2, y1
-
-        dx = x2 - x1
-        dy = y2 - y1
+    def draw_dda(self):
+        self.draw_line(rasterization.iter_dda)
 
-        for x in range(x1, x2 + 1):
-            passed_y = dy * (x - x1) // dx if dx else 0
-            y = y1 + passed_y
-            self.draw_pixel(x, y)
+    def draw_bresenham(self):
+        self.draw_line(rasterization.iter_bresenham)
 
-    def draw_dda(self):
+    def draw_line(self, iter_line):
         try:
             (x1, y1), (x2, y2) = self.get_points()
         except ValueError:
@@ -106,22 +145,9 @@ class LineDemoWindow:
             return
 
         self.clear()
+        self.draw_points(iter_line(x1, y1, x2, y2))
 
-        if x1 > x2:
-            x1, x2 = x2, x1
-            y1, y2 = y2, y1
-
-        dx = x2 - x1
-        dy = y2 - y1
-        l = max(dx, dy)
-
-        self.draw_pixel(x1, y1)
-        for i in range(l):
-            y1 += dy / l
-            x1 += dx / l
-            self.draw_pixel(int(x1), int(y1))
-
-    def draw_bresenham(self):
+    def draw_bresenham_circle(self, filled=False):
         try:
             (x1, y1), (x2, y2) = self.get_points()
         except ValueError:
@@ -130,32 +156,16 @@ class LineDemoWindow:
 
         self.clear()
 
-        is_steep = abs(y2 - y1) > abs(x2 - x1)
-        if is_steep:
-            x1, y1 = y1, x1
-            x2, y2 = y2, x2
-
-        if x1 > x2:
-            x1, x2 = x2, x1
-            y1, y2 = y2, y1
-
-        dx = x2 - x1
-        dy = abs(y2 - y1)
-        error = dx / 2
-        ystep = 1 if y1 < y2 else -1
-        y = y1
-        for x in range(x1, x2 + 1):
-            self.draw_pixel(
-                y if is_steep else x,
-                x if is_steep else y
-            )
-
-            error -= dy
-            if error < 0:
-                y += ystep
-                error += dx
-
-    def draw_bresenham_circle(self):
+        radius = rasterization.get_radius(x1, y1, x2, y2)
+        self.draw_spans(rasterization.iter_circle_spans(x1, y1, radius,
+                                                        filled))
+
+    def draw_disc(self):
+        self.draw_bresenham_circle(filled=True)
+
+    def draw_ellipse(self, filled=False):
+        # The ellipse is centered on the first point and touches the
+        # bounding box corner given by the second one.
         try:
             (x1, y1), (x2, y2) = self.get_points()
         except ValueError:
@@ -164,86 +174,65 @@ class LineDemoWindow:
 
         self.clear()
 
-        x = math.sqrt((x2 - x1) ** 2 + (y2 - y1) ** 2)
-        y = 0
-        radius_error = 1 - x
-
-        while x >= y:
-            self.draw_pixel(x1 + x, y1 + y)
-            self.draw_pixel(x1 + y, y1 + x)
-            self.draw_pixel(x1 - x, y1 + y)
-            self.draw_pixel(x1 - y, y1 + x)
-            self.draw_pixel(x1 - x, y1 - y)
-            self.draw_pixel(x1 - y, y1 - x)
-            self.draw_pixel(x1 + x, y1 - y)
-            self.draw_pixel(x1 + y, y1 - x)
-
-            y += 1
-
-            if radius_error < 0:
-                radius_error += 2 * y + 1
-            else:
-                x -= 1
-                radius_error += 2 * (y - x + 1)
+        self.draw_spans(rasterization.iter_ellipse_spans(
+            x1, y1, abs(x2 - x1), abs(y2 - y1), filled
+        ))
 
     def clear(self):
-        self.main_canvas.delete('all')
-        self.zoom_canvas.delete('all')
-        self.draw_borders()
-
-    def draw_pixel(self, x, y):
-        if x < 0 or x >= CANVAS_WIDTH - CANVAS_PADDING - CANVAS_BORDER_SIZE or \
-                    y < 0 or y >= CANVAS_HEIGHT - CANVAS_PADDING - CANVAS_BORDER_SIZE:
-            return
-
-        self.main_canvas.create_line(
-            x + CANVAS_PADDING + CANVAS_BORDER_SIZE,
-            y + CANVAS_PADDING + CANVAS_BORDER_SIZE,
-            x + CANVAS_PADDING + CANVAS_BORDER_SIZE + 1,
-            y + CANVAS_PADDING + CANVAS_BORDER_SIZE,
-        )
-
-        if x >= ZOOM_CELL_WIDTH or y >= ZOOM_CELL_HEIGHT:
-            return
-
-        zoom_x0 = (
-            x * (ZOOM_CELL_SIZE + CANVAS_BORDER_SIZE) + CANVAS_BORDER_SIZE +
-            CANVAS_PADDING
-        )
-        zoom_x1 = zoom_x0 + ZOOM_CELL_SIZE - 1
-        zoom_y0 = (
-            y * (ZOOM_CELL_SIZE + CANVAS_BORDER_SIZE) + CANVAS_BORDER_SIZE +
-            CANVAS_PADDING
-        )
-        zoom_y1 = zoom_y0 + ZOOM_CELL_SIZE - 1
-        self.zoom_canvas.create_rectangle(zoom_x0, zoom_y0, zoom_x1, zoom_y1,
-                                          fill='black')
-
-    def draw_borders(self):
-        self.main_canvas.create_rectangle(
-            CANVAS_PADDING, CANVAS_PADDING,
-            CANVAS_WIDTH, CANVAS_HEIGHT,
-            outline='grey'
-        )
-        self.main_canvas.create_rectangle(
-            CANVAS_PADDING + CANVAS_BORDER_SIZE,
-            CANVAS_PADDING + CANVAS_BORDER_SIZE,
-            CANVAS_PADDING + CANVAS_BORDER_SIZE + ZOOM_CELL_WIDTH,
-            CANVAS_PADDING + CANVAS_BORDER_SIZE + ZOOM_CELL_HEIGHT,
-            fill='#EEEEEE', outline='#EEEEEE',
-        )
-
-        max_y = ZOOM_CELL_HEIGHT * (ZOOM_CELL_SIZE + CANVAS_BORDER_SIZE) + \
-                CANVAS_PADDING
-        for i in range(0, ZOOM_CELL_WIDTH + 1):
-            x = i * (ZOOM_CELL_SIZE + CANVAS_BORDER_SIZE) + CANVAS_PADDING
-            self.zoom_canvas.create_line(x, 0, x, max_y, fill='gray')
-
-        max_x = ZOOM_CELL_WIDTH * (ZOOM_CELL_SIZE + CANVAS_BORDER_SIZE) + \
-                CANVAS_PADDING
-        for j in range(0, ZOOM_CELL_HEIGHT + 1):
-            y = j * (ZOOM_CELL_SIZE + CANVAS_BORDER_SIZE) + CANVAS_PADDING
-            self.zoom_canvas.create_line(0, y, max_x, y, fill='gray')
+        self.framebuffer.fill(framebuffer.WHITE)
+        self.schedule_present()
+
+    def draw_points(self, points):
+        self.framebuffer.draw_points(points)
+        self.schedule_present()
+
+    def draw_spans(self, spans):
+        self.framebuffer.draw_spans(spans)
+        self.schedule_present()
+
+    def schedule_present(self):
+        # However many pixels a handler draws, the canvases get new images
+        # once, when Tk is idle again.
+        if not self._present_scheduled:
+            self._present_scheduled = True
+            self.root.after_idle(self.present)
+
+    def present(self):
+        self._present_scheduled = False
+
+        self._main_image = tk.PhotoImage(data=self.framebuffer.to_ppm(),
+                                         format='PPM')
+        self.main_canvas.itemconfig(self.main_image_item,
+                                    image=self._main_image)
+        self.zoom_view.update()
+
+    def update_zoom_region(self):
+        x, y, columns, rows = self.zoom_view.get_region()
+        offset = CANVAS_PADDING + CANVAS_BORDER_SIZE
+        self.main_canvas.coords(self.zoom_region_item,
+                                x + offset - 1, y + offset - 1,
+                                x + offset + columns, y + offset + rows)
+
+    def on_main_click(self, event):
+        offset = CANVAS_PADDING + CANVAS_BORDER_SIZE
+        self.zoom_view.center_on(event.x - offset, event.y - offset)
+        self.update_zoom_region()
+
+    def on_zoom_press(self, event):
+        self._drag_pixel = self.zoom_view.get_pixel_at(event.x, event.y)
+
+    def on_zoom_drag(self, event):
+        # The pixel grabbed stays under the mouse.
+        x, y = self.zoom_view.get_pixel_at(event.x, event.y)
+        self.zoom_view.pan(self._drag_pixel[0] - x, self._drag_pixel[1] - y)
+        self.update_zoom_region()
+
+    def on_zoom_wheel(self, event):
+        zoom_in = event.num == 4 or event.delta > 0
+        cell_size = self.zoom_view.cell_size
+        self.zoom_view.set_cell_size(cell_size + 1 if zoom_in
+                                     else cell_size - 1)
+        self.update_zoom_region()
 
 
 def main():
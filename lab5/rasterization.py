@@ -0,0 +1,374 @@
+import collections
+import math
+
+import numpy
+
+import framebuffer
+
+
+# Pixels generated per chunk by the batch rasterizer.
+BATCH_PIXELS = 1 << 20
+
+
+def iter_step(x1, y1, x2, y2):
+    if x1 > x2:
+        x1, x2 = x2, x1
+        y1, y2 = y2, y1
+
+    dx = x2 - x1
+    dy = y2 - y1
+
+    for x in range(x1, x2 + 1):
+        passed_y = dy * (x - x1) // dx if dx else 0
+        yield x, y1 + passed_y
+
+
+def iter_dda(x1, y1, x2, y2):
+    if x1 > x2:
+        x1, x2 = x2, x1
+        y1, y2 = y2, y1
+
+    dx = x2 - x1
+    dy = y2 - y1
+    l = max(abs(dx), abs(dy))
+
+    # Every point is computed from the start, not accumulated, so that the
+    # rounding error doesn't build up and miss the last pixel.
+    yield x1, y1
+    for i in range(1, l + 1):
+        yield (int(math.floor(x1 + dx * i / l + 0.5)),
+               int(math.floor(y1 + dy * i / l + 0.5)))
+
+
+def iter_bresenham(x1, y1, x2, y2):
+    is_steep = abs(y2 - y1) > abs(x2 - x1)
+    if is_steep:
+        x1, y1 = y1, x1
+        x2, y2 = y2, x2
+
+    if x1 > x2:
+        x1, x2 = x2, x1
+        y1, y2 = y2, y1
+
+    dx = x2 - x1
+    dy = abs(y2 - y1)
+    error = dx / 2
+    ystep = 1 if y1 < y2 else -1
+    y = y1
+    for x in range(x1, x2 + 1):
+        yield (y, x) if is_steep else (x, y)
+
+        error -= dy
+        if error < 0:
+            y += ystep
+            error += dx
+
+
+def round_sqrt(value):
+    # The integer closest to sqrt(value); the float square root is only a
+    # first guess, which is then corrected with integer arithmetic.
+    root = int(math.sqrt(value))
+    while root * root > value:
+        root -= 1
+    while (root + 1) * (root + 1) <= value:
+        root += 1
+    # sqrt(value) >= root + 1/2 exactly when value > root * (root + 1).
+    return root + 1 if value > root * (root + 1) else root
+
+
+def get_radius(x1, y1, x2, y2):
+    return round_sqrt((x2 - x1) ** 2 + (y2 - y1) ** 2)
+
+
+def iter_circle_octant(radius):
+    # The points (x, y) with x >= y of a circle around (0, 0).
+    x = radius
+    y = 0
+    radius_error = 1 - x
+
+    while x >= y:
+        yield x, y
+
+        y += 1
+
+        if radius_error < 0:
+            radius_error += 2 * y + 1
+        else:
+            x -= 1
+            radius_error += 2 * (y - x + 1)
+
+
+def iter_circle(center_x, center_y, radius):
+    for x, y in iter_circle_octant(radius):
+        for point_x, point_y in ((x, y), (y, x), (-x, y), (-y, x),
+                                 (-x, -y), (-y, -x), (x, -y), (y, -x)):
+            yield int(center_x + point_x), int(center_y + point_y)
+
+
+def iter_ellipse_quadrant(radius_x, radius_y):
+    # The points (x, y) with x, y >= 0 of an ellipse around (0, 0), by the
+    # midpoint algorithm with every decision value multiplied by 4, so
+    # that it stays integer.
+    if radius_y == 0:
+        for x in range(radius_x + 1):
+            yield x, 0
+        return
+
+    rx2, ry2 = radius_x * radius_x, radius_y * radius_y
+    x, y = 0, radius_y
+
+    # Above the point where the slope is -1, x steps every time.
+    decision = 4 * ry2 - 4 * rx2 * radius_y + rx2
+    while ry2 * x < rx2 * y:
+        yield x, y
+        if decision < 0:
+            decision += 4 * ry2 * (2 * x + 3)
+        else:
+            decision += 4 * ry2 * (2 * x + 3) - 8 * rx2 * (y - 1)
+            y -= 1
+        x += 1
+
+    # Below it, y steps every time.
+    decision = ry2 * (2 * x + 1) ** 2 + 4 * rx2 * (y - 1) ** 2 - \
+        4 * rx2 * ry2
+    while y > 0:
+        yield x, y
+        if decision > 0:
+            decision += 4 * rx2 * (3 - 2 * y)
+        else:
+            decision += 8 * ry2 * (x + 1) + 4 * rx2 * (3 - 2 * y)
+            x += 1
+        y -= 1
+
+    # Very flat ellipses get to y = 0 before x = radius_x.
+    for x in range(x, max(x, radius_x) + 1):
+        yield x, 0
+
+
+def iter_ellipse(center_x, center_y, radius_x, radius_y):
+    for x, y in iter_ellipse_quadrant(radius_x, radius_y):
+        for point_x, point_y in ((x, y), (-x, y), (-x, -y), (x, -y)):
+            yield center_x + point_x, center_y + point_y
+
+
+def get_runs(points):
+    # Consecutive points on the same row joined into (row, x_from, x_to).
+    # The points of a quadrant only ever move one way along a row.
+    runs = []
+    last_y = None
+    for x, y in points:
+        if y == last_y:
+            x_from, x_to = run_x
+            run_x = (min(x_from, x), max(x_to, x))
+        else:
+            if last_y is not None:
+                runs.append((last_y,) + run_x)
+            last_y, run_x = y, (x, x)
+    if last_y is not None:
+        runs.append((last_y,) + run_x)
+    return runs
+
+
+def get_circle_runs(radius):
+    # The quarter circle with x, y >= 0 as horizontal runs. Below the
+    # diagonal every row has one pixel; its mirror above the diagonal has
+    # the long runs along the top.
+    octant = list(iter_circle_octant(radius))
+    return [(y, x, x) for x, y in octant] + \
+        get_runs((y, x) for x, y in octant)
+
+
+def get_ellipse_runs(radius_x, radius_y):
+    return get_runs(iter_ellipse_quadrant(radius_x, radius_y))
+
+
+def iter_outline_spans(center_x, center_y, runs):
+    for row, x_from, x_to in runs:
+        yield center_y + row, center_x + x_from, center_x + x_to
+        yield center_y + row, center_x - x_to, center_x - x_from
+        if row:
+            yield center_y - row, center_x + x_from, center_x + x_to
+            yield center_y - row, center_x - x_to, center_x - x_from
+
+
+def iter_filled_spans(center_x, center_y, runs):
+    half_widths = {}
+    for row, x_from, x_to in runs:
+        if x_to > half_widths.get(row, -1):
+            half_widths[row] = x_to
+    for row, half_width in half_widths.items():
+        yield center_y + row, center_x - half_width, center_x + half_width
+        if row:
+            yield center_y - row, center_x - half_width, center_x + half_width
+
+
+def iter_circle_spans(center_x, center_y, radius, filled=False):
+    runs = get_circle_runs(radius)
+    if filled:
+        return iter_filled_spans(center_x, center_y, runs)
+    return iter_outline_spans(center_x, center_y, runs)
+
+
+def iter_ellipse_spans(center_x, center_y, radius_x, radius_y, filled=False):
+    runs = get_ellipse_runs(radius_x, radius_y)
+    if filled:
+        return iter_filled_spans(center_x, center_y, runs)
+    return iter_outline_spans(center_x, center_y, runs)
+
+
+def expand_segments(segments):
+    # All segments at once: every segment is expanded along its major axis,
+    # and the minor axis offset of its k-th pixel is computed directly. The
+    # scalar loop starts with error = dx / 2 and steps y when the error
+    # drops below zero, which after k pixels has happened
+    # ceil((2 * k * dy - dx) / (2 * dx)) times (never less than 0).
+    x1, y1, x2, y2 = segments.T
+
+    is_steep = numpy.abs(y2 - y1) > numpy.abs(x2 - x1)
+    x1, y1 = numpy.where(is_steep, y1, x1), numpy.where(is_steep, x1, y1)
+    x2, y2 = numpy.where(is_steep, y2, x2), numpy.where(is_steep, x2, y2)
+
+    is_reversed = x1 > x2
+    x1, x2 = numpy.where(is_reversed, x2, x1), numpy.where(is_reversed, x1, x2)
+    y1, y2 = numpy.where(is_reversed, y2, y1), numpy.where(is_reversed, y1, y2)
+
+    dx = x2 - x1
+    dy = numpy.abs(y2 - y1)
+    ystep = numpy.where(y1 < y2, 1, -1)
+
+    lengths = dx + 1
+    segment_index = numpy.repeat(numpy.arange(len(segments)), lengths)
+    k = numpy.arange(len(segment_index))
+    k -= (numpy.cumsum(lengths) - lengths)[segment_index]
+
+    # ceil(a / b) == (a + b - 1) // b for b > 0.
+    double_dx = numpy.maximum(2 * dx, 1)
+    offsets = k * (2 * dy)[segment_index]
+    offsets += (double_dx - 1 - dx)[segment_index]
+    offsets //= double_dx[segment_index]
+    offsets *= ystep[segment_index]
+    return segment_index, k, offsets, x1, y1, is_steep
+
+
+def get_bresenham_pixels(segments):
+    segments = numpy.asarray(segments, dtype=numpy.int64).reshape(-1, 4)
+    segment_index, k, offsets, x1, y1, is_steep = expand_segments(segments)
+    major = x1[segment_index] + k
+    minor = y1[segment_index] + offsets
+    steep = is_steep[segment_index]
+    return (numpy.where(steep, minor, major), numpy.where(steep, major, minor),
+            segment_index)
+
+
+def iter_segment_batches(segments, batch_pixels=BATCH_PIXELS):
+    # Groups of consecutive segments with about batch_pixels pixels in
+    # total, so memory stays bounded however many segments there are.
+    segments = numpy.asarray(segments, dtype=numpy.int64).reshape(-1, 4)
+    lengths = numpy.maximum(numpy.abs(segments[:, 2] - segments[:, 0]),
+                            numpy.abs(segments[:, 3] - segments[:, 1])) + 1
+    ends = numpy.cumsum(lengths)
+    start = 0
+    while start < len(segments):
+        offset = ends[start - 1] if start else 0
+        stop = int(numpy.searchsorted(ends, offset + batch_pixels,
+                                      side='right'))
+        stop = max(stop, start + 1)
+        yield start, segments[start:stop]
+        start = stop
+
+
+def get_pixel_view(target):
+    # One numpy.void element per RGB pixel, so a pixel is written with a
+    # single flat index.
+    return numpy.frombuffer(target.pixels, dtype='V3')
+
+
+def get_void_colors(colors):
+    colors = numpy.ascontiguousarray(colors, dtype=numpy.uint8).reshape(-1, 3)
+    return colors.view('V3').ravel()
+
+
+def draw_lines_batch(target, segments, colors=framebuffer.BLACK,
+                     batch_pixels=BATCH_PIXELS):
+    # colors is either one color or one color per segment. Where segments
+    # overlap, the later one wins, as when drawing them one by one.
+    colors = get_void_colors(colors)
+    pixels = get_pixel_view(target)
+
+    for start, batch in iter_segment_batches(segments, batch_pixels):
+        segment_index, k, offsets, x1, y1, is_steep = expand_segments(batch)
+
+        # Per segment: the flat index of its first pixel, and how far one
+        # step along the major and the minor axis moves in the buffer.
+        first = numpy.where(is_steep, x1 * target.width + y1,
+                            y1 * target.width + x1)
+        major_stride = numpy.where(is_steep, target.width, 1)
+        minor_stride = numpy.where(is_steep, 1, target.width)
+        indices = first[segment_index]
+        indices += k * major_stride[segment_index]
+        indices += offsets * minor_stride[segment_index]
+
+        # A segment with both ends inside has all of its pixels inside.
+        inside_ends = (batch[:, [0, 2]] >= 0).all(axis=1) & \
+            (batch[:, [0, 2]] < target.width).all(axis=1) & \
+            (batch[:, [1, 3]] >= 0).all(axis=1) & \
+            (batch[:, [1, 3]] < target.height).all(axis=1)
+        if not inside_ends.all():
+            major = x1[segment_index] + k
+            minor = y1[segment_index] + offsets
+            steep = is_steep[segment_index]
+            xs = numpy.where(steep, minor, major)
+            ys = numpy.where(steep, major, minor)
+            inside = (xs >= 0) & (xs < target.width) & \
+                (ys >= 0) & (ys < target.height)
+            indices, segment_index = indices[inside], segment_index[inside]
+
+        if len(colors) == 1:
+            pixels[indices] = colors[0]
+        else:
+            pixels[indices] = colors[start + segment_index]
+
+
+LINE_ALGORITHMS = collections.OrderedDict([
+    ('step', iter_step),
+    ('dda', iter_dda),
+    ('bresenham', iter_bresenham),
+])
+
+
+def draw_lines(target, segments, algorithm='bresenham',
+               color=framebuffer.BLACK):
+    iter_line = LINE_ALGORITHMS[algorithm]
+    for x1, y1, x2, y2 in segments:
+        target.draw_points(iter_line(x1, y1, x2, y2), color)
+
+
+def draw_circles(target, circles, color=framebuffer.BLACK, filled=False):
+    for center_x, center_y, radius in circles:
+        target.draw_spans(
+            iter_circle_spans(center_x, center_y, radius, filled), color
+        )
+
+
+def draw_ellipses(target, ellipses, color=framebuffer.BLACK, filled=False):
+    for center_x, center_y, radius_x, radius_y in ellipses:
+        target.draw_spans(
+            iter_ellipse_spans(center_x, center_y, radius_x, radius_y,
+                               filled),
+            color
+        )
+
+
+def rasterize(width, height, segments=(), circles=(), discs=(),
+              algorithm='bresenham', color=framebuffer.BLACK,
+              background=framebuffer.WHITE):
+    # Draws every segment (x1, y1, x2, y2), circle and filled disc
+    # (x, y, radius) into a new framebuffer in one call.
+    target = framebuffer.Framebuffer(width, height, background)
+    if algorithm == 'bresenham':
+        draw_lines_batch(target, segments, color)
+    else:
+        draw_lines(target, segments, algorithm, color)
+    draw_circles(target, circles, color)
+    draw_circles(target, discs, color, filled=True)
+    return target
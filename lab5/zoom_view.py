@@ -0,0 +1,139 @@
+import tkinter as tk
+
+
+GRID_COLOR = (0xBE, 0xBE, 0xBE)
+MIN_CELL_SIZE = 2
+MAX_CELL_SIZE = 40
+
+
+def get_region_rows(target, x, y, columns, rows):
+    # One bytes object per row of the region, so that unchanged rows can be
+    # skipped with a single comparison.
+    width, height, data = target.get_region(x, y, columns, rows)
+    size = width * 3
+    return [data[offset:offset + size]
+            for offset in range(0, height * size, size)]
+
+
+def get_grid_ppm(region_rows, cell_size, grid_color=GRID_COLOR):
+    # Every pixel becomes a cell_size square with a one pixel grid line
+    # above and to the left of it; the last row and column are closed by
+    # one more line.
+    columns = len(region_rows[0]) // 3 if region_rows else 0
+    width = columns * (cell_size + 1) + 1
+    height = len(region_rows) * (cell_size + 1) + 1
+    grid_color = bytes(grid_color)
+    line = grid_color * width
+
+    parts = [b'P6 %d %d 255\n' % (width, height), line]
+    for row in region_rows:
+        cells = b''.join(grid_color + row[offset:offset + 3] * cell_size
+                         for offset in range(0, len(row), 3))
+        parts.append((cells + grid_color) * cell_size)
+        parts.append(line)
+    return b''.join(parts)
+
+
+def iter_changed_cells(old_rows, new_rows):
+    for row, (old, new) in enumerate(zip(old_rows, new_rows)):
+        if old == new:
+            continue
+        for offset in range(0, len(new), 3):
+            if old[offset:offset + 3] != new[offset:offset + 3]:
+                yield offset // 3, row, tuple(new[offset:offset + 3])
+
+
+class ZoomView:
+    # A magnified part of a framebuffer, drawn as one photo image with the
+    # grid baked in. The image is only rendered whole when the view is
+    # panned or zoomed; after that, every update compares the region with
+    # the pixels shown last time and repaints just the cells that changed.
+
+    def __init__(self, canvas, target, width, height, cell_size=10,
+                 padding=0):
+        self.canvas = canvas
+        self.target = target
+        self.width = width
+        self.height = height
+        self.padding = padding
+        self.cell_size = cell_size
+        self.origin_x = 0
+        self.origin_y = 0
+
+        self.image = None
+        self.shown_rows = None
+        self.item = canvas.create_image(padding, padding, anchor='nw')
+
+    @property
+    def columns(self):
+        return min((self.width - self.padding - 1) // (self.cell_size + 1),
+                   self.target.width)
+
+    @property
+    def rows(self):
+        return min((self.height - self.padding - 1) // (self.cell_size + 1),
+                   self.target.height)
+
+    def get_region(self):
+        return self.origin_x, self.origin_y, self.columns, self.rows
+
+    def get_cell_box(self, column, row):
+        x = column * (self.cell_size + 1) + 1
+        y = row * (self.cell_size + 1) + 1
+        return x, y, x + self.cell_size, y + self.cell_size
+
+    def render(self):
+        self.shown_rows = get_region_rows(self.target, *self.get_region())
+        self.image = tk.PhotoImage(
+            data=get_grid_ppm(self.shown_rows, self.cell_size), format='PPM'
+        )
+        self.canvas.itemconfig(self.item, image=self.image)
+
+    def update(self):
+        if self.image is None:
+            self.render()
+            return self.columns * self.rows
+
+        rows = get_region_rows(self.target, *self.get_region())
+        changed = 0
+        for column, row, color in iter_changed_cells(self.shown_rows, rows):
+            self.image.put('#%02x%02x%02x' % color,
+                           to=self.get_cell_box(column, row))
+            changed += 1
+        self.shown_rows = rows
+        return changed
+
+    def clamp_origin(self, x, y):
+        # The view never goes past the edge of the framebuffer.
+        return (max(0, min(x, self.target.width - self.columns)),
+                max(0, min(y, self.target.height - self.rows)))
+
+    def move_to(self, x, y):
+        origin = self.clamp_origin(x, y)
+        if origin != (self.origin_x, self.origin_y):
+            self.origin_x, self.origin_y = origin
+            self.render()
+
+    def pan(self, dx, dy):
+        self.move_to(self.origin_x + dx, self.origin_y + dy)
+
+    def center_on(self, x, y):
+        self.move_to(x - self.columns // 2, y - self.rows // 2)
+
+    def set_cell_size(self, cell_size):
+        # Zooming keeps the pixel in the middle of the view where it is.
+        cell_size = max(MIN_CELL_SIZE, min(cell_size, MAX_CELL_SIZE))
+        if cell_size == self.cell_size:
+            return
+        center_x = self.origin_x + self.columns // 2
+        center_y = self.origin_y + self.rows // 2
+        self.cell_size = cell_size
+        self.origin_x, self.origin_y = self.clamp_origin(
+            center_x - self.columns // 2, center_y - self.rows // 2
+        )
+        self.render()
+
+    def get_pixel_at(self, x, y):
+        # The framebuffer pixel under a point of the canvas.
+        return (self.origin_x + (x - self.padding) // (self.cell_size + 1),
+                self.origin_y + (y - self.padding) // (self.cell_size + 1))